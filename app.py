@@ -5,6 +5,17 @@ import logging
 from logging.handlers import RotatingFileHandler
 import os
 import sys
+import threading
+import zipfile
+
+# Use ISA-L DEFLATE/CRC-32 for every ZIP archive the app writes (query and
+# files downloads) when available (optional dependency). zipfile resolves zlib
+# at call time, so swapping it once here at startup covers all ZipFile users.
+try:
+    from isal import isal_zlib
+    zipfile.zlib = isal_zlib
+except ImportError:
+    pass
 
 # Import db from models
 from models.base import db
@@ -31,6 +42,10 @@ def create_app(config_class=Config):
     # Create storage directory
     os.makedirs(app.config['STORAGE_PATH'], exist_ok=True)
     
+    # Finish query deletes interrupted by a shutdown/restart (in the background)
+    from utils.helpers import sweep_deleting
+    threading.Thread(target=sweep_deleting, args=(app.config['STORAGE_PATH'],), daemon=True).start()
+    
     with app.app_context():
         # Import models (after db initialization)
         from models import User, Query
@@ -42,8 +57,13 @@ def create_app(config_class=Config):
         from services.query_service import QueryService
         from services.scheduler_service import SchedulerService
         
-        emodal_client = EModalClient(app.config['EMODAL_API_URL'])
-        query_service = QueryService(emodal_client)
+        emodal_client = EModalClient(
+            app.config['EMODAL_API_URL'],
+            cache_responses=app.config['EMODAL_RESPONSE_CACHE'],
+            max_concurrency=app.config['EMODAL_MAX_CONCURRENCY'],
+            cache_db=app.config['EMODAL_CACHE_DB'] or None
+        )
+        query_service = QueryService(emodal_client, bulk_checks=app.config['EMODAL_BULK_CHECKS'])
         scheduler_service = SchedulerService(query_service, app)
         
         # Store services in app config for routes to access
@@ -20,13 +20,33 @@ class Config:
     # All client requests must go through our main API (port 5000)
     EMODAL_API_URL = os.getenv('EMODAL_API_URL', 'http://localhost:5010')
     
+    # Short-lived cache for repeated E-Modal reads (containers, appointments, timelines)
+    EMODAL_RESPONSE_CACHE = os.getenv('EMODAL_RESPONSE_CACHE', 'False') == 'True'
+    
+    # Maximum E-Modal API calls in flight across all sessions
+    EMODAL_MAX_CONCURRENCY = int(os.getenv('EMODAL_MAX_CONCURRENCY', '8'))
+    
+    # sqlite file persisting booking numbers across restarts (empty = disabled)
+    EMODAL_CACHE_DB = os.getenv('EMODAL_CACHE_DB', '')
+    
+    # Check appointments for several containers per request (needs /check_appointments_bulk on the E-Modal API)
+    EMODAL_BULK_CHECKS = os.getenv('EMODAL_BULK_CHECKS', 'False') == 'True'
+    
     # Admin
     ADMIN_SECRET_KEY = os.getenv('ADMIN_SECRET_KEY', 'your-admin-key-here')
     
     # Storage
     STORAGE_PATH = os.getenv('STORAGE_PATH', 'storage')
     
+    # File serving
+    # Enable only behind nginx/apache with X-Sendfile (X-Accel-Redirect) support:
+    # send_file then just sets the header and the web server streams the file
+    USE_X_SENDFILE = os.getenv('USE_X_SENDFILE', 'False') == 'True'
+    
     # Scheduler
     SCHEDULER_API_ENABLED = True
     SCHEDULER_TIMEZONE = 'UTC'
+    
+    # Scheduled queries run concurrently for up to this many users (each has its own E-Modal session)
+    SCHEDULER_MAX_PARALLEL_QUERIES = int(os.getenv('SCHEDULER_MAX_PARALLEL_QUERIES', '4'))
 
@@ -23,6 +23,21 @@ class Query(db.Model):
         db.Index('idx_user_status', 'user_id', 'status'),
     )
     
+    def to_dict(self, full=False):
+        """Serialize for API responses (full=True adds folder_path)"""
+        data = {
+            'query_id': self.query_id,
+            'platform': self.platform,
+            'status': self.status,
+            'summary_stats': self.summary_stats,
+            'error_message': self.error_message,
+            'started_at': self.started_at.isoformat(),
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+        if full:
+            data['folder_path'] = self.folder_path
+        return data
+    
     def __repr__(self):
         return f'<Query {self.query_id}>'
 
@@ -1,11 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from werkzeug.security import generate_password_hash
 from models import db, User
+from utils.helpers import forget_dirs
+from routes.files import forget_merged
 from utils.decorators import require_admin
 from services.auth_service import generate_short_token
 from services.file_service import FileService
 import os
-import json
 import shutil
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -140,17 +141,19 @@ def update_credentials(user_id):
     data = request.json
     
     # Load existing credentials
-    creds_file = os.path.join(user.folder_path, 'user_cre_env.json')
-    with open(creds_file, 'r') as f:
-        creds = json.load(f)
+    creds = FileService.load_user_credentials(user)
     
     # Update platform credentials
     platform = data['platform']
     creds[platform] = data['credentials']
     
     # Save back
-    with open(creds_file, 'w') as f:
-        json.dump(creds, f, indent=2)
+    FileService.save_user_credentials(user, creds)
+    
+    # Don't let running queries recover sessions with the old credentials
+    query_service = current_app.config.get('QUERY_SERVICE')
+    if query_service:
+        query_service.forget_credentials(user.id)
     
     # Invalidate session if emodal credentials changed
     if platform == 'emodal':
@@ -167,6 +170,11 @@ def flush_user(user_id):
     user = User.query.get_or_404(user_id)
     
     # Delete folder
+    forget_dirs(user.folder_path)
+    query_service = current_app.config.get('QUERY_SERVICE')
+    if query_service:
+        query_service.forget_credentials(user.id)
+    forget_merged(user.id)
     if os.path.exists(user.folder_path):
         shutil.rmtree(user.folder_path)
     
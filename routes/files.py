@@ -9,6 +9,16 @@ from datetime import datetime, timedelta
 
 files_bp = Blueprint('files', __name__, url_prefix='/files')
 
+# Merged filtered-containers result per user: {user_id: {'key': ..., 'file_path': ..., 'info': {...}}}
+# The key is the (query_id, mtime) of every source file, so any new, changed
+# or deleted query file invalidates it.
+_merged_cache = {}
+
+
+def forget_merged(user_id):
+    """Drop the cached merged filtered-containers result of a user (flush, query delete)"""
+    _merged_cache.pop(user_id, None)
+
 @files_bp.route('/containers/update', methods=['POST'])
 @require_token
 def update_containers():
@@ -74,7 +84,8 @@ def update_containers():
             user.session_id = session_response['session_id']
             db.session.commit()
         
-        # Get containers
+        # Get containers (manual update always bypasses the response cache)
+        emodal_client.invalidate(user.session_id)
         try:
             containers_response = emodal_client.get_containers(user.session_id)
         except Exception as e:
@@ -191,7 +202,8 @@ def update_appointments():
             user.session_id = session_response['session_id']
             db.session.commit()
         
-        # Get appointments
+        # Get appointments (manual update always bypasses the response cache)
+        emodal_client.invalidate(user.session_id)
         try:
             appointments_response = emodal_client.get_appointments(user.session_id)
         except Exception as e:
@@ -877,44 +889,62 @@ def get_all_filtered_containers():
                 'message': 'Please run a query first (option 12 in menu) and wait for it to complete'
             }), 404
         
-        all_containers = []
-        container_tracking = {}  # Track latest occurrence of each container
-        
+        # Stat source files first - this is all the work needed on a cache hit
+        source_files = []
         for query in queries:
             filtered_file = os.path.join(query.folder_path, 'filtered_containers.xlsx')
-            
-            if os.path.exists(filtered_file):
-                try:
-                    # Read filtered containers
-                    df = pd.read_excel(filtered_file, engine='openpyxl', keep_default_na=False)
+            try:
+                mtime = os.path.getmtime(filtered_file)
+            except OSError:
+                continue
+            source_files.append((query, filtered_file, mtime))
+        
+        cache_key = tuple((query.query_id, mtime) for query, _, mtime in source_files)
+        cached = _merged_cache.get(user.id)
+        
+        if cached and cached['key'] == cache_key and os.path.exists(cached['file_path']):
+            from flask import request
+            base_url = request.host_url.rstrip('/')
+            return jsonify({
+                **cached['info'],
+                'download_url': f"{base_url}/files/download/temp/{user.id}/{cached['info']['filename']}",
+                'note': 'Use Authorization header to download: Bearer {{user_token}}'
+            })
+        
+        container_tracking = {}  # Track latest occurrence of each container
+        
+        for query, filtered_file, _ in source_files:
+            try:
+                # Read filtered containers
+                df = pd.read_excel(filtered_file, engine='openpyxl', keep_default_na=False)
+                
+                # Process each container
+                for idx, row in df.iterrows():
+                    container_num = str(row.get('Container #', '')).strip()
                     
-                    # Process each container
-                    for idx, row in df.iterrows():
-                        container_num = str(row.get('Container #', '')).strip()
-                        
-                        if container_num:
-                            # Check if we've seen this container before
-                            if container_num not in container_tracking:
-                                # First time seeing this container
+                    if container_num:
+                        # Check if we've seen this container before
+                        if container_num not in container_tracking:
+                            # First time seeing this container
+                            container_tracking[container_num] = {
+                                'row': row.to_dict(),
+                                'query_timestamp': query.started_at,
+                                'query_id': query.query_id
+                            }
+                        else:
+                            # We've seen this container before - keep the latest one
+                            existing = container_tracking[container_num]
+                            if query.started_at > existing['query_timestamp']:
+                                # This occurrence is newer
                                 container_tracking[container_num] = {
                                     'row': row.to_dict(),
                                     'query_timestamp': query.started_at,
                                     'query_id': query.query_id
                                 }
-                            else:
-                                # We've seen this container before - keep the latest one
-                                existing = container_tracking[container_num]
-                                if query.started_at > existing['query_timestamp']:
-                                    # This occurrence is newer
-                                    container_tracking[container_num] = {
-                                        'row': row.to_dict(),
-                                        'query_timestamp': query.started_at,
-                                        'query_id': query.query_id
-                                    }
-                
-                except Exception as e:
-                    # Skip files that can't be read
-                    continue
+            
+            except Exception as e:
+                # Skip files that can't be read
+                continue
         
         if not container_tracking:
             return jsonify({
@@ -940,19 +970,24 @@ def get_all_filtered_containers():
         # Get file info
         file_size = os.path.getsize(file_path)
         
-        # Create download URL
-        from flask import request
-        base_url = request.host_url.rstrip('/')
-        download_url = f"{base_url}/files/download/temp/{user.id}/{filename}"
-        
-        return jsonify({
+        info = {
             'success': True,
             'file_type': 'excel',
             'filename': filename,
             'file_size': file_size,
             'containers_count': len(merged_df),
             'unique_containers': len(container_tracking),
-            'queries_checked': len(queries),
+            'queries_checked': len(queries)
+        }
+        _merged_cache[user.id] = {'key': cache_key, 'file_path': file_path, 'info': info}
+        
+        # Create download URL
+        from flask import request
+        base_url = request.host_url.rstrip('/')
+        download_url = f"{base_url}/files/download/temp/{user.id}/{filename}"
+        
+        return jsonify({
+            **info,
             'download_url': download_url,
             'note': 'Use Authorization header to download: Bearer {{user_token}}'
         })
@@ -1066,7 +1101,8 @@ def download_master_file(user_id, file_type):
         file_path,
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         as_attachment=True,
-        download_name=filename
+        download_name=filename,
+        conditional=True
     )
 
 
@@ -1105,7 +1141,8 @@ def download_query_file(query_id, file_type):
         file_path,
         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
         as_attachment=True,
-        download_name=download_name
+        download_name=download_name,
+        conditional=True  # Range/304 support for clients polling the latest file
     )
 
 
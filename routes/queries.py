@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify, g, send_file
 from models import db, Query
 from utils.decorators import require_token
+from utils.helpers import forget_dirs
+from routes.files import forget_merged
 import os
 import zipfile
 import io
@@ -9,6 +11,20 @@ import threading
 
 queries_bp = Blueprint('queries', __name__, url_prefix='/queries')
 
+# Text-like files worth compressing in query ZIPs. Everything else (xlsx, png)
+# is already compressed, so it is stored as-is.
+COMPRESSIBLE_EXTENSIONS = ('.csv', '.json', '.log', '.txt')
+
+
+def _iter_files(path):
+    """Recursively yield DirEntry objects for all files under path"""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_files(entry.path)
+            else:
+                yield entry
+
 @queries_bp.route('/trigger', methods=['POST'])
 @require_token
 def trigger_query():
@@ -173,20 +189,28 @@ def list_queries():
     # Get total count
     total = query.count()
     
-    # Apply pagination
-    queries = query.order_by(Query.started_at.desc()).limit(limit).offset(offset).all()
+    # Apply pagination (select only the listed columns - no ORM object hydration)
+    rows = query.with_entities(
+        Query.query_id,
+        Query.platform,
+        Query.status,
+        Query.summary_stats,
+        Query.error_message,
+        Query.started_at,
+        Query.completed_at
+    ).order_by(Query.started_at.desc()).limit(limit).offset(offset).all()
     
     return jsonify({
         'success': True,
         'queries': [{
-            'query_id': q.query_id,
-            'platform': q.platform,
-            'status': q.status,
-            'summary_stats': q.summary_stats,
-            'error_message': q.error_message,
-            'started_at': q.started_at.isoformat(),
-            'completed_at': q.completed_at.isoformat() if q.completed_at else None
-        } for q in queries],
+            'query_id': query_id,
+            'platform': platform,
+            'status': status,
+            'summary_stats': summary_stats,
+            'error_message': error_message,
+            'started_at': started_at.isoformat(),
+            'completed_at': completed_at.isoformat() if completed_at else None
+        } for query_id, platform, status, summary_stats, error_message, started_at, completed_at in rows],
         'total': total,
         'limit': limit,
         'offset': offset
@@ -216,16 +240,7 @@ def get_query(query_id):
     
     return jsonify({
         'success': True,
-        'query': {
-            'query_id': query.query_id,
-            'platform': query.platform,
-            'status': query.status,
-            'folder_path': query.folder_path,
-            'summary_stats': query.summary_stats,
-            'error_message': query.error_message,
-            'started_at': query.started_at.isoformat(),
-            'completed_at': query.completed_at.isoformat() if query.completed_at else None
-        }
+        'query': query.to_dict(full=True)
     })
 
 
@@ -246,12 +261,15 @@ def download_query(query_id):
     
     # Create ZIP in memory
     memory_file = io.BytesIO()
-    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        for root, dirs, files in os.walk(query.folder_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arcname = os.path.relpath(file_path, query.folder_path)
-                zf.write(file_path, arcname)
+    with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_STORED) as zf:
+        # Arcname is the entry path with the query folder prefix sliced off
+        prefix_len = len(query.folder_path.rstrip(os.sep)) + 1
+        for entry in _iter_files(query.folder_path):
+            arcname = entry.path[prefix_len:]
+            if entry.name.lower().endswith(COMPRESSIBLE_EXTENSIONS):
+                zf.write(entry.path, arcname, zipfile.ZIP_DEFLATED, 1)
+            else:
+                zf.write(entry.path, arcname)
     
     memory_file.seek(0)
     
@@ -270,13 +288,37 @@ def delete_query(query_id):
     user = g.current_user
     query = Query.query.filter_by(query_id=query_id, user_id=user.id).first_or_404()
     
-    # Delete folder
-    if os.path.exists(query.folder_path):
-        shutil.rmtree(query.folder_path)
+    folder_path = query.folder_path
     
-    # Delete from database
+    # Delete from database first, so a failed folder move below can't
+    # leave the query listed with its data half gone
     db.session.delete(query)
     db.session.commit()
+    forget_dirs(folder_path)
+    forget_merged(user.id)
+    
+    # Move folder out of the way (atomic on same filesystem) so the actual
+    # delete can happen after the response is sent. Leftover *.deleting
+    # folders (e.g. server stopped mid-delete) are swept at startup
+    deleting_path = None
+    if os.path.exists(folder_path):
+        deleting_path = folder_path.rstrip(os.sep) + '.deleting'
+        try:
+            os.rename(folder_path, deleting_path)
+        except OSError as e:
+            # E.g. a file still open on Windows - delete what can be deleted in place
+            print(f"[WARNING] Could not move {folder_path} aside ({e}), deleting in place")
+            deleting_path = folder_path
+    
+    # Delete folder in background thread (non-blocking)
+    if deleting_path:
+        thread = threading.Thread(
+            target=shutil.rmtree,
+            args=(deleting_path,),
+            kwargs={'ignore_errors': True},
+            daemon=True
+        )
+        thread.start()
     
     return jsonify({'success': True, 'message': 'Query deleted'})
 
@@ -1,9 +1,16 @@
 from flask import Blueprint, request, jsonify, g
+from sqlalchemy import update
 from utils.decorators import require_token
 from models import db, User
 
 schedule_bp = Blueprint('schedule', __name__, url_prefix='/schedule')
 
+
+def _update_user(user, **changes):
+    """Apply column changes with one UPDATE ... WHERE id=? and commit"""
+    db.session.execute(update(User).where(User.id == user.id).values(**changes))
+    db.session.commit()
+
 @schedule_bp.route('', methods=['GET'])
 @require_token
 def get_schedule():
@@ -45,22 +52,27 @@ def update_schedule():
     user = g.current_user
     data = request.json
     
+    # Collect validated column changes
+    changes = {}
+    
     if 'enabled' in data:
-        user.schedule_enabled = data['enabled']
+        changes['schedule_enabled'] = data['enabled']
     
     if 'frequency' in data:
         frequency = int(data['frequency'])
         if frequency < 1:
             return jsonify({'error': 'Frequency must be at least 1 minute'}), 400
-        user.schedule_frequency = frequency
+        changes['schedule_frequency'] = frequency
     
-    db.session.commit()
+    # Single UPDATE statement; skip the commit entirely if nothing changed
+    if changes:
+        _update_user(user, **changes)
     
     return jsonify({
         'success': True,
         'schedule': {
-            'enabled': user.schedule_enabled,
-            'frequency': user.schedule_frequency
+            'enabled': changes.get('schedule_enabled', user.schedule_enabled),
+            'frequency': changes.get('schedule_frequency', user.schedule_frequency)
         }
     })
 
@@ -69,9 +81,7 @@ def update_schedule():
 @require_token
 def pause_schedule():
     """Pause automated queries"""
-    user = g.current_user
-    user.schedule_enabled = False
-    db.session.commit()
+    _update_user(g.current_user, schedule_enabled=False)
     
     return jsonify({'success': True, 'message': 'Schedule paused'})
 
@@ -80,9 +90,7 @@ def pause_schedule():
 @require_token
 def resume_schedule():
     """Resume automated queries"""
-    user = g.current_user
-    user.schedule_enabled = True
-    db.session.commit()
+    _update_user(g.current_user, schedule_enabled=True)
     
     return jsonify({'success': True, 'message': 'Schedule resumed'})
 
@@ -4,36 +4,322 @@ import logging
 import threading
 import json
 import socket
+import shutil
+import sqlite3
+import time
+import copy
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from utils.helpers import ensure_dir
+
+# orjson encodes/decodes E-Modal payloads several times faster (optional dependency).
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so error handling is unchanged.
+try:
+    import orjson
+    _loads = orjson.loads
+    _dumps = orjson.dumps
+except ImportError:
+    _loads = json.loads
+    def _dumps(obj):
+        return json.dumps(obj).encode('utf-8')
 
 logger = logging.getLogger(__name__)
 
+_SESSION_AUTO_REFRESH = {'success': True, 'message': 'Session auto-refresh enabled'}
+
+# Enable TCP keep-alive (works on Windows, Linux, Mac).
+# Probe after 60s idle, every 30s, give up after 4 misses, so a dead
+# peer is detected in ~3 minutes instead of the 2 hour OS default
+# (options missing on some platforms are skipped)
+_SOCKET_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)] + [
+    (socket.IPPROTO_TCP, getattr(socket, name), value)
+    for name, value in (('TCP_KEEPIDLE', 60), ('TCP_KEEPINTVL', 30), ('TCP_KEEPCNT', 4))
+    if hasattr(socket, name)
+]
+
 class TCPKeepAliveAdapter(HTTPAdapter):
     """HTTPAdapter with TCP keep-alive to prevent connection drops during long requests"""
     def init_poolmanager(self, *args, **kwargs):
-        # Enable TCP keep-alive (works on Windows, Linux, Mac)
-        kwargs['socket_options'] = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        kwargs['socket_options'] = _SOCKET_OPTIONS
         return super().init_poolmanager(*args, **kwargs)
 
+class EModalHTTPError(requests.HTTPError):
+    """E-Modal API answered with a 4xx/5xx status"""
+    def __init__(self, endpoint, response, payload=None):
+        self.endpoint = endpoint
+        self.status_code = response.status_code
+        self.payload = payload  # Decoded JSON error body, if the server sent one
+        kind = 'Client' if response.status_code < 500 else 'Server'
+        # Same message format as raise_for_status() - callers match on e.g. '400 Client Error: BAD REQUEST'
+        super().__init__(f"{response.status_code} {kind} Error: {response.reason} for url: {response.url}",
+                         response=response)
+
+class EModalNonJsonError(Exception):
+    """E-Modal API answered with a non-JSON body (HTML error page, file download, ...)"""
+    def __init__(self, endpoint, status_code, content_type, body):
+        self.endpoint = endpoint
+        self.status_code = status_code
+        self.content_type = content_type
+        self.body = body  # First 512 bytes, for diagnostics
+        super().__init__(f"Expected JSON from {endpoint} but got '{content_type}' (status {status_code})")
+
+class _SessionLock:
+    """threading.Lock that can be held in a WeakValueDictionary (plain locks can't be weakly referenced)"""
+    __slots__ = ('_lock', '__weakref__')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+    
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
 class EModalClient:
     """
-    E-Modal API Client with request serialization.
-    Ensures only one API call is made at a time per client instance.
-    Updates session before each request.
+    E-Modal API Client with per-session request serialization.
+    Ensures only one API call is made at a time per E-Modal session;
+    calls for different sessions run in parallel, up to max_concurrency
+    requests in flight overall.
+    Sessions are kept alive by the server on use (see update_session).
     """
-    def __init__(self, base_url):
+    # Response cache TTLs (seconds) for idempotent reads, used when cache_responses=True.
+    # Container-level reads are keyed by container_id only - the data is the same for any session.
+    CACHE_TTLS = {
+        'get_containers': 30,
+        'get_appointments': 30,
+        'get_container_timeline': 300,
+        'get_booking_number': 3600
+    }
+    CACHE_MAX_ENTRIES = 2048
+    SESSIONS_CACHE_TTL = 15  # /sessions listing, always cached
+    USER_SESSION_TTL = 540  # Known username -> session_id, under the 10 minute server keep-alive
+    ENDPOINTS = ('sessions', 'get_session', 'get_containers', 'get_container_timeline',
+                 'check_appointments', 'get_appointments', 'get_booking_number', 'get_info_bulk',
+                 'check_appointments_bulk')
+    TIMEOUT = 2400  # 40 minutes - E-Modal calls drive a browser session
+    JSON_HEADERS = {'Content-Type': 'application/json'}
+    BOOKING_DB_TTL = 86400  # Booking numbers persisted in cache_db (seconds)
+    
+    def __init__(self, base_url, cache_responses=False, max_concurrency=8, cache_db=None):
         self.base_url = base_url
+        self._urls = {name: f"{base_url}/{name}" for name in self.ENDPOINTS}
         self.session = requests.Session()
         
-        # Add TCP keep-alive adapter to prevent timeouts on long requests
-        adapter = TCPKeepAliveAdapter(max_retries=Retry(total=0))
+        # Add TCP keep-alive adapter to prevent timeouts on long requests.
+        # Pool is sized for parallel per-session calls so connections stay warm.
+        # Only retry connect errors, where the request never reached the API.
+        # Never re-send after a read timeout or an error status - the API is
+        # called directly, so any 5xx comes from it after it may already have
+        # driven the browser session (calls can take 40 minutes).
+        adapter = TCPKeepAliveAdapter(
+            pool_connections=32,
+            pool_maxsize=64,
+            max_retries=Retry(
+                total=3,
+                connect=3,
+                read=0,
+                status=0,
+                backoff_factor=0.5,
+                allowed_methods=frozenset(['GET', 'POST']),
+                raise_on_status=False
+            )
+        )
         self.session.mount('http://', adapter)
         self.session.mount('https://', adapter)
         
-        self._lock = threading.Lock()  # Ensure sequential API calls
-        logger.info(f"E-Modal API client initialized with TCP keep-alive: {base_url}")
-        print(f"[SYSTEM] E-Modal client configured for long requests (TCP keep-alive enabled)")
+        # One lock per session_id, dropped once no caller holds or waits on it,
+        # so expired/recovered session ids don't keep their lock forever
+        self._locks = weakref.WeakValueDictionary()
+        self._locks_mu = threading.Lock()  # Guards creation of per-session locks
+        self._login_lock = threading.Lock()  # Ensure only one session creation at a time
+        self._api_sem = threading.BoundedSemaphore(max_concurrency)  # Caps total in-flight API calls
+        
+        # LRU response cache: (endpoint, session_id or container_id) -> (timestamp, etag, last_modified, response)
+        self.cache_responses = cache_responses
+        self._cache = OrderedDict()
+        self._cache_mu = threading.Lock()
+        self._supports_conditional = None  # Unknown until the first cached read
+        
+        # Optional sqlite cache for booking numbers, survives restarts
+        self._cache_db = None
+        self._cache_db_mu = threading.Lock()
+        if cache_db:
+            self._cache_db = sqlite3.connect(cache_db, check_same_thread=False, isolation_level=None)
+            self._cache_db.execute('PRAGMA journal_mode=WAL')
+            self._cache_db.execute('PRAGMA synchronous=NORMAL')
+            self._cache_db.execute('CREATE TABLE IF NOT EXISTS booking (container_id TEXT PRIMARY KEY, data BLOB, ts REAL)')
+        
+        # In-flight reads: (endpoint, ..., session_id) -> Future shared by duplicate callers of one session
+        self._inflight = {}
+        self._inflight_mu = threading.Lock()
+        self._supports_bulk_checks = None  # Unknown until the first check_appointments_bulk() call
+        
+        # Last /sessions listing: (timestamp, data)
+        self._sessions_cache = None
+        self._sessions_cache_lock = threading.Lock()
+        
+        # username -> (session_id, timestamp) from the last successful get_session
+        self._user_sessions = {}
+        self._user_sessions_mu = threading.Lock()
+        logger.info("E-Modal API client initialized with TCP keep-alive: %s", base_url)
+        
+        # Open a pooled connection in the background so the first real call skips the handshake
+        threading.Thread(target=self._warm_up, daemon=True).start()
+    
+    def _warm_up(self):
+        """Fill the connection pool with one cheap request; errors are irrelevant"""
+        try:
+            self.session.head(self.base_url, timeout=5)
+        except Exception:
+            pass
+    
+    def _session_lock(self, session_id):
+        """Get (creating if needed) the lock serializing calls for a session"""
+        with self._locks_mu:
+            lock = self._locks.get(session_id)
+            if lock is None:
+                lock = self._locks[session_id] = _SessionLock()
+            return lock
+    
+    def _cached(self, key, producer, *args):
+        """
+        Return a cached response for key if fresh, otherwise call producer(*args)
+        
+        key[0] is the endpoint name (selects the TTL). producer returns
+        (response, result) and accepts a headers kwarg. Stale entries are
+        revalidated with If-None-Match/If-Modified-Since when the server sends
+        validators; a 304 reuses the cached result without a body download.
+        Only successful responses are cached. Callers hold the session lock,
+        so concurrent requests for the same key wait for the first one and
+        hit the cache.
+        """
+        if not self.cache_responses:
+            return producer(*args)[1]
+        
+        with self._cache_mu:
+            entry = self._cache.get(key)
+            if entry and time.monotonic() - entry[0] < self.CACHE_TTLS[key[0]]:
+                self._cache.move_to_end(key)
+                logger.debug("Cache hit: %s", key[0])
+                return copy.deepcopy(entry[3])
+        
+        # Revalidate a stale entry instead of re-downloading it
+        headers = {}
+        if entry and self._supports_conditional is not False:
+            if entry[1]:
+                headers['If-None-Match'] = entry[1]
+            if entry[2]:
+                headers['If-Modified-Since'] = entry[2]
+        
+        response, result = producer(*args, headers=headers or None)
+        
+        if response.status_code == 304 and entry:
+            logger.debug("Not modified: %s", key[0])
+            etag, last_modified, result = entry[1], entry[2], entry[3]
+        else:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            # First full response tells us whether the server sends validators at all
+            if self._supports_conditional is None:
+                self._supports_conditional = bool(etag or last_modified)
+            if not result.get('success'):
+                return result
+        
+        with self._cache_mu:
+            self._cache[key] = (time.monotonic(), etag, last_modified, copy.deepcopy(result))
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.CACHE_MAX_ENTRIES:
+                self._cache.popitem(last=False)
+        return copy.deepcopy(result) if response.status_code == 304 else result
+    
+    def _singleflight(self, key, fn, *args):
+        """
+        Run fn(*args) once for concurrent callers asking for the same key
+        
+        The first caller performs the request; callers arriving while it is
+        in flight wait for and share its result (or exception) instead of
+        issuing a duplicate request. Only use for idempotent reads.
+        """
+        with self._inflight_mu:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        
+        if not leader:
+            logger.debug("Joining in-flight request: %s", key[0])
+            return copy.deepcopy(future.result())
+        
+        try:
+            result = fn(*args)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_mu:
+                self._inflight.pop(key, None)
+    
+    def _locked_read(self, session_id, key, producer, *args):
+        """Cached read under the session lock"""
+        with self._session_lock(session_id):  # Ensure sequential execution per session
+            return self._cached(key, producer, *args)
+    
+    def invalidate(self, session_id):
+        """Drop all cached responses for a session"""
+        with self._cache_mu:
+            for key in [k for k in self._cache if k[1] == session_id]:
+                del self._cache[key]
+    
+    def _post_json(self, endpoint, payload, headers=None):
+        """
+        POST payload to an E-Modal endpoint and decode the JSON response
+        
+        The Content-Type is checked before decoding, so HTML error pages or
+        file bodies fail fast without a JSON parse attempt. JSON error bodies
+        on 4xx/5xx responses are decoded and attached to the raised error.
+        
+        Returns:
+            tuple: (response, parsed JSON or None on 304 Not Modified)
+        
+        Raises:
+            EModalHTTPError: On 4xx/5xx status (message keeps the status, e.g. '400 Client Error: BAD REQUEST');
+                             .payload holds the decoded JSON error body, if any
+            EModalNonJsonError: If the body is not JSON
+        """
+        headers = {**headers, **self.JSON_HEADERS} if headers else self.JSON_HEADERS
+        with self._api_sem:
+            response = self.session.post(self._urls[endpoint], data=_dumps(payload), headers=headers, timeout=self.TIMEOUT)
+        if response.status_code == 304:
+            return response, None
+        
+        content_type = response.headers.get('Content-Type', '')
+        if response.status_code >= 400:
+            if response.status_code in (400, 401) and payload.get('session_id'):
+                self.forget_session(payload['session_id'])  # Likely expired - don't hand it out again
+            error_body = None
+            if 'json' in content_type:
+                try:
+                    error_body = _loads(response.content)
+                except json.JSONDecodeError:
+                    pass
+            raise EModalHTTPError(endpoint, response, error_body)
+        
+        if content_type and 'json' not in content_type:
+            raise EModalNonJsonError(endpoint, response.status_code, content_type, response.content[:512])
+        
+        try:
+            return response, _loads(response.content)
+        except json.JSONDecodeError as e:
+            raise EModalNonJsonError(endpoint, response.status_code, content_type, response.content[:512]) from e
     
     def update_session(self, session_id):
         """
@@ -48,26 +334,39 @@ class EModalClient:
             session_id: Current session ID
             
         Returns:
-            dict: Success response (no actual API call needed)
+            dict: Success response (no actual API call needed, shared - do not modify)
         """
         # No API call needed - sessions auto-refresh on use
-        logger.debug(f"Session {session_id[:30]}... will be kept alive automatically")
-        return {'success': True, 'message': 'Session auto-refresh enabled'}
+        return _SESSION_AUTO_REFRESH
     
     def list_active_sessions(self):
-        """List all active sessions on the E-Modal API server"""
-        try:
-            logger.info("Checking for active sessions")
-            url = f"{self.base_url}/sessions"
-            response = self.session.get(url, timeout=2400)  # 40 minutes timeout
-            response.raise_for_status()
-            
-            data = response.json()
-            logger.info(f"Found {data.get('active_sessions', 0)} active sessions")
-            return data
-        except Exception as e:
-            logger.warning(f"Failed to list active sessions: {e}")
-            return {'active_sessions': 0, 'sessions': []}
+        """
+        List all active sessions on the E-Modal API server
+        
+        The listing is cached for SESSIONS_CACHE_TTL seconds; concurrent
+        callers wait for a single fetch. Failures are not cached.
+        """
+        with self._sessions_cache_lock:
+            if self._sessions_cache and time.monotonic() - self._sessions_cache[0] < self.SESSIONS_CACHE_TTL:
+                return self._sessions_cache[1]
+            try:
+                logger.info("Checking for active sessions")
+                with self._api_sem:
+                    response = self.session.get(self._urls['sessions'], timeout=self.TIMEOUT)
+                response.raise_for_status()
+                
+                data = _loads(response.content)
+                logger.info("Found %s active sessions", data.get('active_sessions', 0))
+                self._sessions_cache = (time.monotonic(), data)
+                return data
+            except Exception as e:
+                logger.warning("Failed to list active sessions: %s", e)
+                return {'active_sessions': 0, 'sessions': []}
+    
+    def invalidate_sessions_cache(self):
+        """Force the next list_active_sessions() call to hit the server"""
+        with self._sessions_cache_lock:
+            self._sessions_cache = None
     
     def find_active_session_for_user(self, username):
         """Find an active session for a specific username"""
@@ -77,225 +376,289 @@ class EModalClient:
             for session in sessions_data.get('sessions', []):
                 if session.get('username') == username:
                     session_id = session.get('session_id')
-                    logger.info(f"Found active session for {username}: {session_id[:40]}...")
+                    logger.info("Found active session for %s: %.40s...", username, session_id)
                     return session_id
             
-            logger.info(f"No active session found for {username}")
+            logger.info("No active session found for %s", username)
             return None
         except Exception as e:
-            logger.error(f"Failed to find active session: {e}")
+            logger.error("Failed to find active session: %s", e)
             return None
     
+    def forget_session(self, session_id):
+        """
+        Drop everything cached for a session that is expired or invalid
+        
+        The next get_session() for its user asks the server again instead
+        of returning the remembered session_id.
+        """
+        with self._user_sessions_mu:
+            for username in [u for u, (sid, ts) in self._user_sessions.items() if sid == session_id]:
+                del self._user_sessions[username]
+        self.invalidate_sessions_cache()
+        self.invalidate(session_id)
+    
     def get_session(self, username, password, captcha_api_key):
         """Get session - checks for active sessions first, creates new if needed"""
-        with self._lock:  # Ensure only one session creation at a time
-            try:
-                # STEP 1: Check for existing active session first
-                logger.info(f"Checking for active session for user: {username}")
-                active_session_id = self.find_active_session_for_user(username)
-                
-                if active_session_id:
-                    logger.info(f"Reusing active session: {active_session_id[:40]}...")
-                    return {
-                        'success': True,
-                        'session_id': active_session_id,
-                        'is_new': False,
-                        'username': username,
-                        'message': 'Using existing active session from server'
-                    }
-                
-                # STEP 2: No active session found, create new one
-                logger.info(f"No active session found, creating new session for: {username}")
-                response = self.session.post(f"{self.base_url}/get_session", json={
+        with self._login_lock:  # Ensure only one session creation at a time
+            result = self._get_session(username, password, captcha_api_key)
+            if result.get('success') and result.get('session_id'):
+                with self._user_sessions_mu:
+                    self._user_sessions[username] = (result['session_id'], time.monotonic())
+            return result
+    
+    def _get_session(self, username, password, captcha_api_key):
+        """Resolve or create the session for username (caller must hold the login lock)"""
+        with self._user_sessions_mu:
+            known = self._user_sessions.get(username)
+        if known and time.monotonic() - known[1] < self.USER_SESSION_TTL:
+            logger.debug("Reusing known session for %s: %.40s...", username, known[0])
+            return {
+                'success': True,
+                'session_id': known[0],
+                'is_new': False,
+                'username': username,
+                'message': 'Using existing active session from server'
+            }
+        
+        try:
+            # STEP 1: Check for existing active session first
+            logger.info("Checking for active session for user: %s", username)
+            active_session_id = self.find_active_session_for_user(username)
+            
+            if active_session_id:
+                logger.info("Reusing active session: %.40s...", active_session_id)
+                return {
+                    'success': True,
+                    'session_id': active_session_id,
+                    'is_new': False,
                     'username': username,
-                    'password': password,
-                    'captcha_api_key': captcha_api_key
-                }, timeout=2400)  # 40 minutes timeout
-                response.raise_for_status()
+                    'message': 'Using existing active session from server'
+                }
+            
+            # STEP 2: No active session found, create new one
+            logger.info("No active session found, creating new session for: %s", username)
+            response, result = self._post_json('get_session', {
+                'username': username,
+                'password': password,
+                'captcha_api_key': captcha_api_key
+            })
+            logger.info("Session created: %.40s... (is_new: %s)", result.get('session_id', ''), result.get('is_new'))
+            self.invalidate_sessions_cache()
+            return result
                 
-                # Parse JSON response
-                try:
-                    result = response.json()
-                    logger.info(f"Session created: {result.get('session_id', '')[:40]}... (is_new: {result.get('is_new')})")
-                    return result
-                except json.JSONDecodeError as je:
-                    logger.error(f"Invalid JSON response from get_session: {response.text[:200]}")
-                    raise Exception(f"Invalid JSON from E-Modal API: {response.text[:100]}")
-                    
-            except Exception as e:
-                logger.error(f"Failed to get E-Modal session: {e}")
-                raise
+        except Exception as e:
+            logger.error("Failed to get E-Modal session: %s", e)
+            raise
     
     def get_containers(self, session_id):
         """Get all containers with infinite scrolling"""
-        with self._lock:  # Ensure sequential execution
-            try:
-                # Update session before request
-                self.update_session(session_id)
-                
-                logger.info(f"Getting containers for session: {session_id}")
-                response = self.session.post(f"{self.base_url}/get_containers", json={
-                    'session_id': session_id,
-                    'infinite_scrolling': True,
-                    'debug': False,
-                    'return_url': True  # Get JSON response with file URL instead of direct file
-                }, timeout=2400)  # 40 minutes timeout
-                response.raise_for_status()
-                
-                # Parse JSON response
-                try:
-                    result = response.json()
-                    logger.info(f"Containers retrieved successfully. Count: {result.get('total_containers', 'N/A')}")
-                    return result
-                except json.JSONDecodeError as je:
-                    logger.error(f"Invalid JSON response from get_containers. Status: {response.status_code}, Content-Type: {response.headers.get('Content-Type')}")
-                    raise Exception(f"Expected JSON response but got file. Use return_url=true parameter.")
-                    
-            except Exception as e:
-                logger.error(f"Failed to get containers: {e}")
-                raise
+        key = ('get_containers', session_id)
+        return self._singleflight(key, self._locked_read, session_id, key, self._raw_containers, session_id)
+    
+    def _raw_containers(self, session_id, headers=None):
+        """
+        POST /get_containers (caller must hold the session lock)
+        
+        Returns:
+            tuple: (response, parsed JSON or None on 304 Not Modified)
+        """
+        try:
+            logger.info("Getting containers for session: %s", session_id)
+            response, result = self._post_json('get_containers', {
+                'session_id': session_id,
+                'infinite_scrolling': True,
+                'debug': False,
+                'return_url': True  # Get JSON response with file URL instead of direct file
+            }, headers)
+            if result is not None:
+                logger.info("Containers retrieved successfully. Count: %s", result.get('total_containers', 'N/A'))
+            return response, result
+            
+        except Exception as e:
+            logger.error("Failed to get containers: %s", e)
+            raise
     
     def get_container_timeline(self, session_id, container_id):
         """Get timeline for specific container"""
-        with self._lock:  # Ensure sequential execution
-            try:
-                # Update session before request
-                self.update_session(session_id)
-                
-                logger.debug(f"Getting timeline for container: {container_id}")
-                response = self.session.post(f"{self.base_url}/get_container_timeline", json={
-                    'session_id': session_id,
-                    'container_id': container_id,
-                    'debug': True
-                }, timeout=2400)  # 40 minutes timeout
-                response.raise_for_status()
-                
-                # Parse JSON response
-                try:
-                    result = response.json()
-                    logger.debug(f"Timeline retrieved for container: {container_id}")
-                    return result
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON from get_container_timeline: {response.text[:200]}")
-                    raise Exception(f"Invalid JSON from E-Modal API: {response.text[:100]}")
-                    
-            except Exception as e:
-                logger.error(f"Failed to get container timeline for {container_id}: {e}")
-                raise
+        key = ('get_container_timeline', container_id)
+        # Cache is shared across sessions, but only coalesce in-flight calls of the same
+        # session - a follower must never inherit another session's expiry error
+        return self._singleflight(key + (session_id,), self._locked_read, session_id, key,
+                                  self._raw_timeline, session_id, container_id)
     
-    def check_appointments(self, session_id, container_type, trucking_company, terminal, move_type,
-                          container_id=None, booking_number=None, truck_plate='ABC123', own_chassis=False,
-                          container_number=None, pin_code=None, unit_number=None, seal_value=None,
-                          manifested_date=None, departed_date=None, last_free_day_date=None,
-                          line=None, equip_size=None):
-        """Check appointment availability for IMPORT or EXPORT containers"""
-        with self._lock:  # Ensure sequential execution
-            try:
-                # Update session before request
-                self.update_session(session_id)
-                
-                # Build payload
-                payload = {
+    def _raw_timeline(self, session_id, container_id, headers=None):
+        """
+        POST /get_container_timeline (caller must hold the session lock)
+        
+        Returns:
+            tuple: (response, parsed JSON or None on 304 Not Modified)
+        """
+        try:
+            logger.debug("Getting timeline for container: %s", container_id)
+            response, result = self._post_json('get_container_timeline', {
+                'session_id': session_id,
+                'container_id': container_id,
+                'debug': True
+            }, headers)
+            logger.debug("Timeline retrieved for container: %s", container_id)
+            return response, result
+            
+        except Exception as e:
+            logger.error("Failed to get container timeline for %s: %s", container_id, e)
+            raise
+    
+    def check_appointments(self, session_id, *args, **kwargs):
+        """
+        Check appointment availability for IMPORT or EXPORT containers
+        
+        Accepts the same arguments as _raw_check_appointments.
+        """
+        with self._session_lock(session_id):  # Ensure sequential execution per session
+            return self._raw_check_appointments(session_id, *args, **kwargs)
+    
+    def _raw_check_appointments(self, session_id, container_type, trucking_company, terminal, move_type,
+                                container_id=None, booking_number=None, truck_plate='ABC123', own_chassis=False,
+                                container_number=None, pin_code=None, unit_number=None, seal_value=None,
+                                manifested_date=None, departed_date=None, last_free_day_date=None,
+                                line=None, equip_size=None):
+        """POST /check_appointments (caller must hold the session lock)"""
+        try:
+            payload = self._appointment_payload(
+                session_id, container_type, trucking_company, terminal, move_type,
+                container_id, booking_number, truck_plate, own_chassis, container_number,
+                pin_code, unit_number, seal_value, manifested_date, departed_date,
+                last_free_day_date, line, equip_size
+            )
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Checking appointments for %s: %s", container_type.upper(), container_id or booking_number)
+                logger.debug("Payload being sent: %s", payload)
+                logger.debug("Sending to E-Modal API: %s (line=%s, equip_size=%s)",
+                             list(payload), payload.get('line'), payload.get('equip_size'))
+            response, result = self._post_json('check_appointments', payload)
+            logger.debug("Appointment check completed for %s", container_type)
+            return result
+            
+        except Exception as e:
+            logger.error("Failed to check appointments: %s", e)
+            raise
+    
+    @staticmethod
+    def _appointment_payload(session_id, container_type, trucking_company, terminal, move_type,
+                             container_id=None, booking_number=None, truck_plate='ABC123', own_chassis=False,
+                             container_number=None, pin_code=None, unit_number=None, seal_value=None,
+                             manifested_date=None, departed_date=None, last_free_day_date=None,
+                             line=None, equip_size=None):
+        """Build the /check_appointments request body (optional fields are only sent when set)"""
+        optional = {
+            'container_number': container_number,
+            'container_id': container_id,
+            'booking_number': booking_number,
+            'pin_code': pin_code,
+            'unit_number': unit_number,
+            'seal_value': seal_value,
+            'manifested_date': manifested_date,
+            'departed_date': departed_date,
+            'last_free_day_date': last_free_day_date,
+            'line': line,
+            'equip_size': equip_size
+        }
+        payload = {
+            'session_id': session_id,
+            'container_type': container_type,
+            'trucking_company': trucking_company,
+            'terminal': terminal,
+            'move_type': move_type,
+            'truck_plate': truck_plate,
+            'debug': True,
+            **{key: value for key, value in optional.items() if value}
+        }
+        return payload
+    
+    def check_appointments_bulk(self, session_id, requests_list):
+        """
+        Check appointments for several containers in a single round trip
+        
+        Uses the server's /check_appointments_bulk endpoint. If the server
+        does not implement it (404/405), this is remembered and None is
+        returned so the caller can fall back to check_appointments().
+        
+        Args:
+            session_id: Browser session ID
+            requests_list: List of dicts with check_appointments keyword
+                           arguments (without session_id)
+            
+        Returns:
+            list: Appointment responses in input order, or None if unsupported
+        """
+        if self._supports_bulk_checks is False:
+            return None
+        
+        payloads = [self._appointment_payload(session_id, **params) for params in requests_list]
+        try:
+            with self._session_lock(session_id):
+                response, data = self._post_json('check_appointments_bulk', {
                     'session_id': session_id,
-                    'container_type': container_type,
-                    'trucking_company': trucking_company,
-                    'terminal': terminal,
-                    'move_type': move_type,
-                    'truck_plate': truck_plate,
-                    'debug': True
-                }
-                
-                # Add all optional fields
-                if container_number:
-                    payload['container_number'] = container_number
-                if container_id:
-                    payload['container_id'] = container_id
-                if booking_number:
-                    payload['booking_number'] = booking_number
-                if pin_code:
-                    payload['pin_code'] = pin_code
-                if unit_number:
-                    payload['unit_number'] = unit_number
-                if seal_value:
-                    payload['seal_value'] = seal_value
-                if manifested_date:
-                    payload['manifested_date'] = manifested_date
-                if departed_date:
-                    payload['departed_date'] = departed_date
-                if last_free_day_date:
-                    payload['last_free_day_date'] = last_free_day_date
-                if line:
-                    payload['line'] = line
-                if equip_size:
-                    payload['equip_size'] = equip_size
-                
-                logger.debug(f"Checking appointments for {container_type.upper()}: {container_id or booking_number}")
-                logger.debug(f"Payload being sent: {payload}")
-                print(f"[DEBUG] Sending to E-Modal API: {list(payload.keys())}")
-                if 'line' in payload:
-                    print(f"[DEBUG] line: {payload['line']}")
-                if 'equip_size' in payload:
-                    print(f"[DEBUG] equip_size: {payload['equip_size']}")
-                response = self.session.post(f"{self.base_url}/check_appointments", json=payload, timeout=2400)
-                response.raise_for_status()
-                
-                # Parse JSON response
-                try:
-                    result = response.json()
-                    logger.debug(f"Appointment check completed for {container_type.upper()}")
-                    return result
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON from check_appointments: {response.text[:200]}")
-                    raise Exception(f"Invalid JSON from E-Modal API: {response.text[:100]}")
-                    
-            except Exception as e:
-                logger.error(f"Failed to check appointments: {e}")
+                    'requests': payloads
+                })
+        except EModalHTTPError as e:
+            if e.status_code not in (404, 405):
                 raise
+            logger.info("E-Modal API has no /check_appointments_bulk endpoint, using per-container checks")
+            self._supports_bulk_checks = False
+            return None
+        
+        self._supports_bulk_checks = True
+        return data.get('results', [])
     
     def get_appointments(self, session_id):
         """Get all appointments with infinite scrolling"""
-        with self._lock:  # Ensure sequential execution
-            try:
-                # Update session before request
-                self.update_session(session_id)
-                
-                logger.info(f"Getting appointments for session: {session_id}")
-                response = self.session.post(f"{self.base_url}/get_appointments", json={
-                    'session_id': session_id,
-                    'infinite_scrolling': True,
-                    'debug': False,
-                    'return_url': True  # Get JSON response with file URL instead of direct file
-                }, timeout=2400)  # 40 minutes timeout
-                response.raise_for_status()
-                
-                # Parse JSON response
-                try:
-                    result = response.json()
-                    logger.info(f"Appointments retrieved successfully. Count: {result.get('selected_count', 'N/A')}")
-                    return result
-                except json.JSONDecodeError as je:
-                    logger.error(f"Invalid JSON response from get_appointments. Status: {response.status_code}, Content-Type: {response.headers.get('Content-Type')}")
-                    raise Exception(f"Expected JSON response but got file. Use return_url=true parameter.")
-                    
-            except Exception as e:
-                logger.error(f"Failed to get appointments: {e}")
-                raise
+        key = ('get_appointments', session_id)
+        return self._singleflight(key, self._locked_read, session_id, key, self._raw_appointments, session_id)
+    
+    def _raw_appointments(self, session_id, headers=None):
+        """
+        POST /get_appointments (caller must hold the session lock)
+        
+        Returns:
+            tuple: (response, parsed JSON or None on 304 Not Modified)
+        """
+        try:
+            logger.info("Getting appointments for session: %s", session_id)
+            response, result = self._post_json('get_appointments', {
+                'session_id': session_id,
+                'infinite_scrolling': True,
+                'debug': False,
+                'return_url': True  # Get JSON response with file URL instead of direct file
+            }, headers)
+            if result is not None:
+                logger.info("Appointments retrieved successfully. Count: %s", result.get('selected_count', 'N/A'))
+            return response, result
+            
+        except Exception as e:
+            logger.error("Failed to get appointments: %s", e)
+            raise
     
     def download_file(self, url, destination_path):
-        """Download file from URL"""
-        with self._lock:  # Ensure sequential execution
-            try:
-                logger.debug(f"Downloading file from: {url}")
-                response = self.session.get(url, stream=True, timeout=2400)  # 40 minutes timeout
+        """Download file from URL (not locked - downloads are independent of sessions)"""
+        try:
+            logger.debug("Downloading file from: %s", url)
+            # Context manager returns the pooled connection even if the write fails
+            with self.session.get(url, stream=True, timeout=self.TIMEOUT) as response:
                 response.raise_for_status()
-                os.makedirs(os.path.dirname(destination_path), exist_ok=True)
-                with open(destination_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                logger.info(f"Downloaded file to {destination_path}")
-            except Exception as e:
-                logger.error(f"Failed to download file from {url}: {e}")
-                raise
+                ensure_dir(os.path.dirname(destination_path))
+                response.raw.decode_content = True  # Keep transparent gzip/deflate decoding
+                # Write to a temp name and rename: never truncates a file that is
+                # hard-linked elsewhere, and readers never see a partial download
+                part_path = f"{destination_path}.part"
+                with open(part_path, 'wb') as f:
+                    shutil.copyfileobj(response.raw, f, length=1024 * 1024)  # 1 MiB reads
+                os.replace(part_path, destination_path)
+            logger.info("Downloaded file to %s", destination_path)
+        except Exception as e:
+            logger.error("Failed to download file from %s: %s", url, e)
+            raise
     
     def get_booking_number(self, session_id, container_id, debug=False):
         """
@@ -309,37 +672,62 @@ class EModalClient:
         Returns:
             dict: Response with booking_number or error
         """
-        with self._lock:  # Ensure sequential execution
-            try:
-                logger.info(f"Getting booking number for container: {container_id}")
-                
-                # Update session before calling
-                self.update_session(session_id)
-                
-                url = f"{self.base_url}/get_booking_number"
-                payload = {
-                    'session_id': session_id,
-                    'container_id': container_id,
-                    'debug': debug
-                }
-                
-                response = self.session.post(url, json=payload, timeout=2400)  # 40 minutes timeout
-                response.raise_for_status()
-                
-                # Parse JSON response
-                try:
-                    data = response.json()
-                    logger.info(f"Booking number response: success={data.get('success')}, booking={data.get('booking_number')}")
-                    return data
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse booking number response as JSON: {e}")
-                    logger.error(f"Response Content-Type: {response.headers.get('Content-Type')}")
-                    logger.error(f"Response text (first 200 chars): {response.text[:200]}")
-                    raise Exception(f"Invalid JSON response: {str(e)}")
-                
-            except Exception as e:
-                logger.error(f"Get booking number failed: {e}")
-                raise
+        if debug:  # Debug responses carry per-call artifacts, never cache them
+            with self._session_lock(session_id):  # Ensure sequential execution per session
+                return self._raw_booking_number(session_id, container_id, debug)[1]
+        data = self._load_booking(container_id)
+        if data is not None:
+            return data
+        
+        key = ('get_booking_number', container_id)
+        data = self._singleflight(key + (session_id,), self._locked_read, session_id, key,
+                                  self._raw_booking_number, session_id, container_id)
+        if data.get('success') and data.get('booking_number'):
+            self._store_booking(container_id, data)
+        return data
+    
+    def _load_booking(self, container_id):
+        """Booking number response from cache_db if fresh, else None"""
+        if self._cache_db is None:
+            return None
+        with self._cache_db_mu:
+            row = self._cache_db.execute('SELECT data, ts FROM booking WHERE container_id = ?',
+                                         (container_id,)).fetchone()
+        if row and time.time() - row[1] < self.BOOKING_DB_TTL:
+            logger.debug("Booking number from cache db: %s", container_id)
+            return _loads(row[0])
+        return None
+    
+    def _store_booking(self, container_id, data):
+        """Persist a successful booking number response to cache_db"""
+        if self._cache_db is None:
+            return
+        with self._cache_db_mu:
+            self._cache_db.execute('INSERT OR REPLACE INTO booking (container_id, data, ts) VALUES (?, ?, ?)',
+                                   (container_id, _dumps(data), time.time()))
+    
+    def _raw_booking_number(self, session_id, container_id, debug=False, headers=None):
+        """
+        POST /get_booking_number (caller must hold the session lock)
+        
+        Returns:
+            tuple: (response, parsed JSON or None on 304 Not Modified)
+        """
+        try:
+            logger.info("Getting booking number for container: %s", container_id)
+            
+            response, data = self._post_json('get_booking_number', {
+                'session_id': session_id,
+                'container_id': container_id,
+                'debug': debug
+            }, headers)
+            if data is not None:
+                logger.info("Booking number response: success=%s, booking=%s", data.get('success'), data.get('booking_number'))
+            return response, data
+            
+        except Exception as e:
+            logger.error("Get booking number failed: %s", e)
+            raise
     
     def get_info_bulk(self, session_id, import_containers=None, export_containers=None, debug=False):
         """
@@ -354,11 +742,11 @@ class EModalClient:
         Returns:
             dict: Response with import_results and export_results
         """
-        with self._lock:  # Ensure sequential execution
+        with self._session_lock(session_id):  # Ensure sequential execution per session
             try:
-                logger.info(f"Getting bulk info: {len(import_containers or [])} IMPORT, {len(export_containers or [])} EXPORT")
+                logger.info("Getting bulk info: %s IMPORT, %s EXPORT", len(import_containers or []), len(export_containers or []))
                 
-                url = f"{self.base_url}/get_info_bulk"
+                url = self._urls['get_info_bulk']
                 payload = {
                     'session_id': session_id,
                     'import_containers': import_containers or [],
@@ -366,72 +754,54 @@ class EModalClient:
                     'debug': debug
                 }
                 
+                # Operator-facing progress stays on stdout - service loggers have no handler attached
                 print(f">>> Sending request to: {url}")
                 print(f">>> Payload: import={len(payload['import_containers'])}, export={len(payload['export_containers'])}")
                 print(f">>> Waiting for response (timeout: 40 minutes, typically 1-5 minutes)...")
-                print(f">>> REQUEST SENT at {__import__('datetime').datetime.now().strftime('%H:%M:%S')}")
-                print(f">>> E-Modal API is processing... (progress indicator will print every 30 seconds)")
                 
-                import time
-                import threading as thread_module
                 start_time = time.time()
                 
-                # Progress indicator thread
-                stop_indicator = thread_module.Event()
+                # Progress indicator: one-shot timers re-armed every 30 seconds,
+                # cancelled immediately once the response arrives
+                progress = {'count': 0, 'timer': None, 'done': False}
                 def print_progress():
-                    count = 0
-                    while not stop_indicator.is_set():
-                        time.sleep(30)
-                        if not stop_indicator.is_set():
-                            count += 30
-                            elapsed_min = count // 60
-                            elapsed_sec = count % 60
-                            print(f">>> Still waiting... ({elapsed_min}m {elapsed_sec}s elapsed)")
-                
-                progress_thread = thread_module.Thread(target=print_progress, daemon=True)
-                progress_thread.start()
+                    if progress['done']:
+                        return
+                    progress['count'] += 30
+                    elapsed_min = progress['count'] // 60
+                    elapsed_sec = progress['count'] % 60
+                    print(f">>> Still waiting... ({elapsed_min}m {elapsed_sec}s elapsed)")
+                    schedule_progress()
+                def schedule_progress():
+                    timer = threading.Timer(30, print_progress)
+                    timer.daemon = True
+                    progress['timer'] = timer
+                    timer.start()
                 
+                schedule_progress()
                 try:
-                    response = self.session.post(url, json=payload, timeout=2400)  # 40 minutes timeout
+                    response, data = self._post_json('get_info_bulk', payload)
                 finally:
-                    stop_indicator.set()
+                    progress['done'] = True
+                    progress['timer'].cancel()
                     
                 elapsed = time.time() - start_time
                 
                 print(f">>> Response received after {elapsed:.1f} seconds!")
-                print(f">>> Status code: {response.status_code}")
-                print(f">>> Content length: {len(response.content)} bytes")
-                print(f">>> Content type: {response.headers.get('content-type', 'unknown')}")
-                response.raise_for_status()
-                
-                # Parse JSON response
-                print(f">>> Attempting to parse JSON response...")
-                try:
-                    print(f">>> Calling response.json()...")
-                    data = response.json()
-                    print(f">>> JSON parsed successfully!")
-                    print(f">>> Response success: {data.get('success')}")
-                    logger.info(f"Bulk info response: success={data.get('success')}")
-                    if data.get('success'):
-                        summary = data.get('results', {}).get('summary', {})
-                        print(f">>> Bulk summary: {summary}")
-                        logger.info(f"Bulk summary: {summary}")
-                    else:
-                        print(f">>> Bulk error: {data.get('error', 'Unknown')}")
-                    return data
-                except json.JSONDecodeError as e:
-                    print(f">>> [ERROR] JSON parsing failed!")
-                    logger.error(f"Failed to parse bulk info response as JSON: {e}")
-                    logger.error(f"Response Content-Type: {response.headers.get('Content-Type')}")
-                    logger.error(f"Response text (first 200 chars): {response.text[:200]}")
-                    raise Exception(f"Invalid JSON response: {str(e)}")
+                logger.debug(">>> Status %s, %s bytes, %s", response.status_code, len(response.content),
+                             response.headers.get('content-type', 'unknown'))
+                print(f">>> Response success: {data.get('success')}")
+                logger.info("Bulk info response: success=%s", data.get('success'))
+                if data.get('success'):
+                    summary = data.get('results', {}).get('summary', {})
+                    print(f">>> Bulk summary: {summary}")
+                    logger.info("Bulk summary: %s", summary)
+                else:
+                    print(f">>> Bulk error: {data.get('error', 'Unknown')}")
+                    logger.warning("Bulk error: %s", data.get('error', 'Unknown'))
+                return data
                 
             except Exception as e:
-                print(f">>> [EXCEPTION] Bulk API call failed!")
-                print(f">>> Exception type: {type(e).__name__}")
-                print(f">>> Exception message: {e}")
-                logger.error(f"Get bulk info failed: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.error("Get bulk info failed (%s): %s", type(e).__name__, e)
                 raise
 
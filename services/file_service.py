@@ -1,6 +1,18 @@
 import os
 import json
 import logging
+from utils.helpers import ensure_dir
+
+# orjson is a faster drop-in for credential files (optional dependency)
+try:
+    import orjson
+    _loads = orjson.loads
+    def _dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+except ImportError:
+    _loads = json.loads
+    def _dumps(obj):
+        return json.dumps(obj, indent=2).encode('utf-8')
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +26,12 @@ class FileService:
         
         for platform in PLATFORMS:
             platform_path = os.path.join(user.folder_path, platform)
-            os.makedirs(platform_path, exist_ok=True)
+            ensure_dir(platform_path)
             
             # Create queries folder for emodal
             if platform == 'emodal':
                 queries_path = os.path.join(platform_path, 'queries')
-                os.makedirs(queries_path, exist_ok=True)
+                ensure_dir(queries_path)
         
         logger.info(f"Created folder structure for user {user.username}")
     
@@ -39,24 +51,38 @@ class FileService:
             'lbct': {}
         }
         
-        creds_file = os.path.join(user.folder_path, 'user_cre_env.json')
-        with open(creds_file, 'w') as f:
-            json.dump(creds, f, indent=2)
+        FileService.save_user_credentials(user, creds)
         
         logger.info(f"Created credentials file for user {user.username}")
     
+    @staticmethod
+    def save_user_credentials(user, creds):
+        """
+        Write user_cre_env.json atomically
+        
+        The file is written to a temp file and renamed over the original,
+        so concurrent readers never see a partially written file.
+        """
+        creds_file = os.path.join(user.folder_path, 'user_cre_env.json')
+        tmp_file = creds_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(_dumps(creds))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, creds_file)
+    
     @staticmethod
     def load_user_credentials(user):
         """Load user_cre_env.json"""
         creds_file = os.path.join(user.folder_path, 'user_cre_env.json')
-        with open(creds_file, 'r') as f:
-            return json.load(f)
+        with open(creds_file, 'rb') as f:
+            return _loads(f.read())
     
     @staticmethod
     def create_query_folders(query_folder):
         """Create folder structure for query"""
-        os.makedirs(os.path.join(query_folder, 'containers_checking_attempts', 'screenshots'), exist_ok=True)
-        os.makedirs(os.path.join(query_folder, 'containers_checking_attempts', 'responses'), exist_ok=True)
+        ensure_dir(os.path.join(query_folder, 'containers_checking_attempts', 'screenshots'))
+        ensure_dir(os.path.join(query_folder, 'containers_checking_attempts', 'responses'))
         logger.info(f"Created query folder structure at {query_folder}")
 
 
@@ -1,14 +1,53 @@
 import os
+import re
 import json
 import time
+import random
 import shutil
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import numpy as np
 import pandas as pd
 from services.timeline_utils import extract_milestone_date, find_earliest_appointment
+from utils.helpers import ensure_dir, link_or_copy
+
+# orjson writes the per-container response files several times faster (optional dependency)
+try:
+    import orjson
+    def _dumps(obj):
+        return orjson.dumps(obj, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj, indent=2, default=str).encode('utf-8')
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_TRUCKING_COMPANY = 'K & R TRANSPORTATION LLC'
+
+
+def _backoff_delay(attempt, base=2.0):
+    """Exponential backoff with full jitter for retry number attempt (1-based)"""
+    return random.uniform(0, base * 2 ** (attempt - 1))
+
+# Rust-backed calamine reads Excel several times faster than openpyxl
+# (optional dependency, pandas >= 2.2 only)
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_READ_ENGINE = 'calamine' if tuple(map(int, pd.__version__.split('.')[:2])) >= (2, 2) else 'openpyxl'
+except ImportError:
+    EXCEL_READ_ENGINE = 'openpyxl'
+
+# xlsxwriter writes .xlsx considerably faster than openpyxl (optional dependency).
+# URL-looking cells stay plain strings, as they are with openpyxl
+try:
+    import xlsxwriter  # noqa: F401
+    EXCEL_WRITE_ENGINE = 'xlsxwriter'
+    EXCEL_WRITE_KWARGS = {'engine_kwargs': {'options': {'strings_to_urls': False}}}
+except ImportError:
+    EXCEL_WRITE_ENGINE = 'openpyxl'
+    EXCEL_WRITE_KWARGS = {}
+
 
 def get_check(emodal_client, session_id, container_data, query_folder, terminal_mapping, trucking_companies, max_retries=2):
     """
@@ -58,12 +97,15 @@ def get_check(emodal_client, session_id, container_data, query_folder, terminal_
         'retries': 0
     }
     
+    # Trucking company doesn't depend on anything the retries fetch
+    trucking_company = determine_trucking_company(container_data, trucking_companies)
+    
     # Retry loop
     for retry_attempt in range(max_retries):
         if retry_attempt > 0:
-            logger.info(f"Retry attempt {retry_attempt}/{max_retries-1} for container {container_number}")
+            logger.info("Retry attempt %s/%s for container %s", retry_attempt, max_retries-1, container_number)
             result['retries'] = retry_attempt
-            time.sleep(2)  # Brief delay between retries
+            time.sleep(_backoff_delay(retry_attempt))  # Jittered delay between retries
         
         try:
             # STEP 1: Handle IMPORT vs EXPORT flow to get timeline/booking
@@ -73,7 +115,7 @@ def get_check(emodal_client, session_id, container_data, query_folder, terminal_
             
             if trade_type == 'IMPORT':
                 # IMPORT: Get timeline to check passed_pregate
-                logger.info(f"IMPORT flow: Getting timeline for {container_number}")
+                logger.info("IMPORT flow: Getting timeline for %s", container_number)
                 timeline_response = emodal_client.get_container_timeline(session_id, container_number)
                 
                 if not timeline_response.get('success'):
@@ -81,7 +123,7 @@ def get_check(emodal_client, session_id, container_data, query_folder, terminal_
                     raise Exception('Timeline fetch failed')
             else:
                 # EXPORT: Get booking number
-                logger.info(f"EXPORT flow: Getting booking number for {container_number}")
+                logger.info("EXPORT flow: Getting booking number for %s", container_number)
                 booking_response = emodal_client.get_booking_number(session_id, container_number, debug=False)
                 
                 if not booking_response.get('success') or not booking_response.get('booking_number'):
@@ -91,7 +133,7 @@ def get_check(emodal_client, session_id, container_data, query_folder, terminal_
                 booking_number = booking_response.get('booking_number')
                 identifier = booking_number  # Use booking number for EXPORT
                 result['booking_number'] = booking_number
-                logger.info(f"Got booking number: {booking_number}")
+                logger.info("Got booking number: %s", booking_number)
             
             # STEP 2: Determine move type (needs timeline for IMPORT)
             move_type = determine_move_type(container_data, timeline_response)
@@ -104,11 +146,8 @@ def get_check(emodal_client, session_id, container_data, query_folder, terminal_
                 return result
             result['terminal'] = terminal
             
-            # STEP 4: Determine trucking company
-            trucking_company = determine_trucking_company(container_data, trucking_companies)
-            
-            # STEP 5: Check appointments
-            logger.info(f"Checking appointments: {identifier}, {terminal}, {move_type}, {trucking_company}")
+            # STEP 4: Check appointments
+            logger.info("Checking appointments: %s, %s, %s, %s", identifier, terminal, move_type, trucking_company)
             
             # Build check_appointments parameters
             check_params = {
@@ -127,14 +166,14 @@ def get_check(emodal_client, session_id, container_data, query_folder, terminal_
                 line = str(container_data.get('Line', '')).strip()
                 equip_size = str(container_data.get('Equip Size', '')).strip()
                 
-                if line and line != '' and line.lower() != 'nan':
+                if line and line.lower() != 'nan':
                     check_params['line'] = line
-                if equip_size and equip_size != '' and equip_size.lower() != 'nan':
+                if equip_size and equip_size.lower() != 'nan':
                     check_params['equip_size'] = equip_size
             
             appointment_response = emodal_client.check_appointments(**check_params)
             
-            # STEP 6: Save response JSON
+            # STEP 5: Save response JSON
             response_filename = f"{container_number}_{timestamp}.json"
             response_path = os.path.join(
                 query_folder,
@@ -143,10 +182,10 @@ def get_check(emodal_client, session_id, container_data, query_folder, terminal_
                 response_filename
             )
             
-            os.makedirs(os.path.dirname(response_path), exist_ok=True)
+            ensure_dir(os.path.dirname(response_path))
             
             combined_response = {
-                'container_data': container_data,
+                'container_number': container_number,  # Row lives in filtered_containers.xlsx
                 'timeline': timeline_response,
                 'booking_number': booking_number,
                 'appointment_check': appointment_response,
@@ -156,12 +195,12 @@ def get_check(emodal_client, session_id, container_data, query_folder, terminal_
                 'timestamp': timestamp
             }
             
-            with open(response_path, 'w') as f:
-                json.dump(combined_response, f, indent=2)
+            with open(response_path, 'wb') as f:
+                f.write(_dumps(combined_response))
             
             result['response_path'] = response_path
             
-            # STEP 7: Download and save screenshot
+            # STEP 6: Download and save screenshot
             screenshot_url = appointment_response.get('dropdown_screenshot_url')
             if screenshot_url:
                 screenshot_filename = f"{container_number}_{timestamp}.png"
@@ -175,7 +214,7 @@ def get_check(emodal_client, session_id, container_data, query_folder, terminal_
                 emodal_client.download_file(screenshot_url, screenshot_path)
                 result['screenshot_path'] = screenshot_path
             
-            # STEP 8: Extract results
+            # STEP 7: Extract results
             result['success'] = appointment_response.get('success', False)
             result['available_times'] = appointment_response.get('available_times', [])
         
@@ -188,20 +227,25 @@ def get_check(emodal_client, session_id, container_data, query_folder, terminal_
             
             # If this was not the last retry, log that we'll retry
             if retry_attempt < max_retries - 1:
-                logger.warning(f"Container {container_number} check failed, will retry: {result.get('error')}")
+                logger.warning("Container %s check failed, will retry: %s", container_number, result.get('error'))
             
         except Exception as e:
             result['error'] = str(e)
-            logger.error(f"get_check attempt {retry_attempt+1} failed for {container_number}: {e}")
+            logger.error("get_check attempt %s failed for %s: %s", retry_attempt+1, container_number, e)
             
-            # If this was not the last retry, continue to next attempt
+            # If this was not the last retry, log that we'll retry
             if retry_attempt < max_retries - 1:
-                logger.info(f"Will retry container {container_number}")
-                continue
+                logger.info("Will retry container %s", container_number)
     
     return result
 
 
+def _location_code(container_data, column):
+    """Stripped location cell value, or '' when the cell is blank, 'N/A' or NaN"""
+    value = str(container_data.get(column, '')).strip()
+    return '' if value.upper() in ('N/A', 'NAN') else value
+
+
 def determine_terminal(container_data, terminal_mapping, move_type):
     """
     Determine terminal full name from container data and move type
@@ -218,34 +262,30 @@ def determine_terminal(container_data, terminal_mapping, move_type):
         - If "PICK" in move_type: Use Destination (I), fallback to Current Loc (J)
         - If "DROP" in move_type: Use Origin (H), fallback to Current Loc (J)
     """
-    current_loc = str(container_data.get('Current Loc', '')).strip()
-    origin = str(container_data.get('Origin', '')).strip()
-    destination = str(container_data.get('Destination', '')).strip()
+    move_type_upper = move_type.upper()
     
-    # Determine terminal code based on move type
-    if 'PICK' in move_type.upper():
+    # Determine terminal code based on move type - only the columns a branch
+    # actually uses are read and normalized
+    if 'PICK' in move_type_upper:
         # PICK: Use Destination, fallback to Current Loc
-        terminal_code = destination if destination and destination.upper() != 'N/A' and destination != 'nan' else current_loc
-        logger.info(f"PICK operation: Using destination='{destination}' or current_loc='{current_loc}'")
-    elif 'DROP' in move_type.upper():
+        terminal_code = _location_code(container_data, 'Destination') or _location_code(container_data, 'Current Loc')
+        logger.info("PICK operation: Using terminal code '%s'", terminal_code)
+    elif 'DROP' in move_type_upper:
         # DROP: Use Origin, fallback to Current Loc
-        terminal_code = origin if origin and origin.upper() != 'N/A' and origin != 'nan' else current_loc
-        logger.info(f"DROP operation: Using origin='{origin}' or current_loc='{current_loc}'")
+        terminal_code = _location_code(container_data, 'Origin') or _location_code(container_data, 'Current Loc')
+        logger.info("DROP operation: Using terminal code '%s'", terminal_code)
     else:
         # Fallback: use current_loc
-        terminal_code = current_loc
-        logger.warning(f"Unknown move type '{move_type}', using current_loc='{current_loc}'")
-    
-    # Clean terminal code
-    terminal_code = terminal_code.strip() if terminal_code else ''
+        terminal_code = _location_code(container_data, 'Current Loc')
+        logger.warning("Unknown move type '%s', using current_loc='%s'", move_type, terminal_code)
     
     # Map to full terminal name
     terminal_full_name = terminal_mapping.get(terminal_code)
     
     if not terminal_full_name:
-        logger.warning(f"Terminal code '{terminal_code}' not found in mapping for move_type '{move_type}'")
+        logger.warning("Terminal code '%s' not found in mapping for move_type '%s'", terminal_code, move_type)
     else:
-        logger.info(f"Terminal determined: {terminal_code} -> {terminal_full_name} (move_type: {move_type})")
+        logger.info("Terminal determined: %s -> %s (move_type: %s)", terminal_code, terminal_full_name, move_type)
     
     return terminal_full_name
 
@@ -275,13 +315,13 @@ def determine_move_type(container_data, timeline_response):
         
         if passed_pregate:
             move_type = 'DROP EMPTY'
-            logger.info(f"IMPORT with passed_pregate=True -> {move_type}")
+            logger.info("IMPORT with passed_pregate=True -> %s", move_type)
         else:
             move_type = 'PICK FULL'
-            logger.info(f"IMPORT with passed_pregate=False -> {move_type}")
+            logger.info("IMPORT with passed_pregate=False -> %s", move_type)
     else:  # EXPORT
         move_type = 'DROP FULL'
-        logger.info(f"EXPORT -> {move_type}")
+        logger.info("EXPORT -> %s", move_type)
     
     return move_type
 
@@ -301,8 +341,8 @@ def determine_trucking_company(container_data, trucking_companies):
         - Use any trucking company (default to first one)
     """
     # Use the first trucking company from the list
-    trucking_company = trucking_companies[0] if trucking_companies else 'K & R TRANSPORTATION LLC'
-    logger.info(f"Using trucking company: {trucking_company}")
+    trucking_company = trucking_companies[0] if trucking_companies else DEFAULT_TRUCKING_COMPANY
+    logger.info("Using trucking company: %s", trucking_company)
     return trucking_company
 
 
@@ -361,8 +401,41 @@ class QueryService:
         'DROP EMPTY'
     ]
     
-    def __init__(self, emodal_client):
+    # Parallel screenshot downloads while the next container is checked
+    SCREENSHOT_DOWNLOAD_WORKERS = 4
+    
+    # Seconds between filtered_containers.xlsx checkpoints while checking
+    EXCEL_CHECKPOINT_INTERVAL = 60
+    
+    # Containers per /check_appointments_bulk request (when bulk checks are enabled)
+    BULK_CHECK_CHUNK = 10
+    
+    # Error substrings that mean the E-Modal session has expired
+    SESSION_ERROR_RE = re.compile('|'.join(map(re.escape, (
+        '400 Client Error: BAD REQUEST',
+        '401',
+        'Unauthorized',
+        'Invalid session',
+        'Session expired'
+    ))))
+    
+    def __init__(self, emodal_client, bulk_checks=False):
         self.emodal_client = emodal_client
+        self.bulk_checks = bulk_checks
+        self._credentials_cache = {}  # user_id -> E-Modal credentials
+    
+    def _get_emodal_credentials(self, user):
+        """Return the user's E-Modal credentials, reading user_cre_env.json only on first use"""
+        emodal_creds = self._credentials_cache.get(user.id)
+        if emodal_creds is None:
+            from services.file_service import FileService
+            emodal_creds = FileService.load_user_credentials(user).get('emodal', {})
+            self._credentials_cache[user.id] = emodal_creds
+        return emodal_creds
+    
+    def forget_credentials(self, user_id):
+        """Drop cached credentials after they change on disk"""
+        self._credentials_cache.pop(user_id, None)
     
     def execute_query(self, user, platform='emodal'):
         """
@@ -384,25 +457,22 @@ class QueryService:
         # Generate query ID
         query_id = f"q_{user.id}_{int(time.time())}"
         
-        # Create query record
+        # Create query record - it starts running right away, so insert it
+        # as in_progress instead of committing a separate pending transition
         query = Query(
             query_id=query_id,
             user_id=user.id,
             platform=platform,
-            status='pending',
+            status='in_progress',
             folder_path=self._get_query_folder_path(user.id, query_id)
         )
         db.session.add(query)
         db.session.commit()
         
-        # Create folder structure
-        from services.file_service import FileService
-        FileService.create_query_folders(query.folder_path)
-        
         try:
-            # Update status to in_progress
-            query.status = 'in_progress'
-            db.session.commit()
+            # Create folder structure
+            from services.file_service import FileService
+            FileService.create_query_folders(query.folder_path)
             
             # Ensure user has active session
             session_id = self._ensure_session(user, current_query_id=query_id)
@@ -445,7 +515,6 @@ class QueryService:
             Exception if session creation fails after all retries
         """
         from models import db, Query
-        from services.file_service import FileService
         
         if user.session_id:
             # TODO: Verify session is still valid
@@ -453,8 +522,7 @@ class QueryService:
             return user.session_id
         
         # Load credentials
-        creds = FileService.load_user_credentials(user)
-        emodal_creds = creds.get('emodal', {})
+        emodal_creds = self._get_emodal_credentials(user)
         
         # Retry loop for 401 errors
         for attempt in range(max_retries):
@@ -589,54 +657,16 @@ class QueryService:
         start_time = time.time()
         stats = {}
         
-        print(f"\n{'='*80}")
-        print(f"  STEP 1: GET ALL CONTAINERS")
-        print(f"{'='*80}")
+        print(f"\n{'='*80}\n  STEP 1: GET ALL CONTAINERS\n{'='*80}")
         print(f"[QUERY {query.query_id}] Calling E-Modal API: get_containers()")
         print(f"[QUERY {query.query_id}] Session ID: {session_id[:40]}...")
         print(f"[QUERY {query.query_id}] Timeout: 40 minutes")
         logger.info(f"Getting all containers for query {query.query_id}")
         
-        # Try to get containers with retry on session error
-        max_retries = 2
-        for attempt in range(max_retries):
-            try:
-                containers_response = self.emodal_client.get_containers(session_id)
-                
-                if containers_response.get('success'):
-                    break  # Success, exit retry loop
-                
-                error_msg = containers_response.get('error', '')
-                print(f"[WARNING] Get containers failed: {error_msg}")
-                
-                # Check if it's a session error (400 Bad Request)
-                if '400' in str(error_msg) or 'BAD REQUEST' in str(error_msg).upper():
-                    if attempt < max_retries - 1:  # Not last attempt
-                        print(f"[INFO] Session appears invalid, creating new session...")
-                        session_id = self._recover_session(user, current_query_id=query.query_id)
-                        print(f"[INFO] New session created: {session_id[:40]}...")
-                        print(f"[INFO] Retrying get_containers...")
-                        continue
-                
-                # Not a session error or last attempt failed
-                print(f"[ERROR] Failed to get containers: {error_msg}")
-                raise Exception(f"Failed to get containers: {error_msg}")
-                
-            except Exception as e:
-                error_msg = str(e)
-                print(f"[ERROR] Exception getting containers: {error_msg}")
-                
-                # Check if it's a session error
-                if '400' in error_msg or 'BAD REQUEST' in error_msg.upper():
-                    if attempt < max_retries - 1:  # Not last attempt
-                        print(f"[INFO] Session error detected, recovering...")
-                        session_id = self._recover_session(user, current_query_id=query.query_id)
-                        print(f"[INFO] New session: {session_id[:40]}...")
-                        print(f"[INFO] Retrying...")
-                        continue
-                
-                # Not a session error or last attempt
-                raise
+        # Get containers, recovering the session once on session errors
+        containers_response, session_id = self._call_with_session_retry(
+            user, session_id, query.query_id, 'get_containers'
+        )
         
         print(f"[SUCCESS] Containers retrieved!")
         print(f"[QUERY {query.query_id}] File URL: {containers_response.get('file_url', '')[:50]}...")
@@ -649,15 +679,13 @@ class QueryService:
         
         # Also update master file
         master_containers = os.path.join(user.folder_path, 'emodal', 'all_containers.xlsx')
-        os.makedirs(os.path.dirname(master_containers), exist_ok=True)
-        shutil.copy(containers_file, master_containers)
+        ensure_dir(os.path.dirname(master_containers))
+        link_or_copy(containers_file, master_containers)
         
         stats['total_containers'] = containers_response.get('containers_count', 0)
         print(f"[QUERY {query.query_id}] Total containers: {stats['total_containers']}")
         
-        print(f"\n{'='*80}")
-        print(f"  STEP 2: FILTER CONTAINERS")
-        print(f"{'='*80}")
+        print(f"\n{'='*80}\n  STEP 2: FILTER CONTAINERS\n{'='*80}")
         print(f"[QUERY {query.query_id}] Reading containers from: {containers_file}")
         print(f"[QUERY {query.query_id}] Filter criteria: Holds=NO AND Pregate contains N/A")
         logger.info(f"Filtering containers for query {query.query_id}")
@@ -677,13 +705,19 @@ class QueryService:
         filtered_df['First Appointment Available (After)'] = 'null'
         filtered_df['Empty Received'] = 'null'
         
-        # Set EXPORT containers to "N/A" for all timeline fields
-        export_mask = filtered_df['Trade Type'].str.upper() == 'EXPORT'
-        filtered_df.loc[export_mask, 'Manifested'] = 'N/A'
-        filtered_df.loc[export_mask, 'First Appointment Available (Before)'] = 'N/A'
-        filtered_df.loc[export_mask, 'Departed Terminal'] = 'N/A'
-        filtered_df.loc[export_mask, 'First Appointment Available (After)'] = 'N/A'
-        filtered_df.loc[export_mask, 'Empty Received'] = 'N/A'
+        # Set EXPORT containers to "N/A" for all timeline fields.
+        # Trade Type is normalized once into a categorical Series (comparisons are
+        # small-integer code compares) and reused for the breakdown below; the
+        # column itself is written to Excel as-is
+        trade_types = filtered_df['Trade Type'].astype(str).str.strip().str.upper().astype('category')
+        export_mask = trade_types == 'EXPORT'
+        filtered_df.loc[export_mask, [
+            'Manifested',
+            'First Appointment Available (Before)',
+            'Departed Terminal',
+            'First Appointment Available (After)',
+            'Empty Received'
+        ]] = 'N/A'
         
         print(f"[QUERY {query.query_id}] Columns AFTER adding: {len(filtered_df.columns)}")
         print(f"[QUERY {query.query_id}] Last 5 columns: {list(filtered_df.columns)[-5:]}")
@@ -691,24 +725,17 @@ class QueryService:
         filtered_file = os.path.join(query.folder_path, 'filtered_containers.xlsx')
         print(f"[QUERY {query.query_id}] Saving to: {filtered_file}")
         
-        filtered_df.to_excel(filtered_file, index=False, engine='openpyxl')
+        filtered_df.to_excel(filtered_file, index=False, engine=EXCEL_WRITE_ENGINE, **EXCEL_WRITE_KWARGS)
         print(f"[QUERY {query.query_id}] File saved successfully!")
         
-        # Verify by reading back
-        verify_df = pd.read_excel(filtered_file, engine='openpyxl')
-        print(f"[QUERY {query.query_id}] Verified columns in saved file: {len(verify_df.columns)}")
-        print(f"[QUERY {query.query_id}] Last 5 columns in file: {list(verify_df.columns)[-5:]}")
-        
         stats['filtered_containers'] = len(filtered_df)
         
         # Show breakdown
-        import_count = len(filtered_df[filtered_df['Trade Type'].str.upper() == 'IMPORT'])
-        export_count = len(filtered_df[filtered_df['Trade Type'].str.upper() == 'EXPORT'])
+        import_count = int((trade_types == 'IMPORT').sum())
+        export_count = int(export_mask.sum())
         print(f"[QUERY {query.query_id}] Breakdown: {import_count} IMPORT, {export_count} EXPORT")
         
-        print(f"\n{'='*80}")
-        print(f"  STEP 3: GET BULK CONTAINER INFO")
-        print(f"{'='*80}")
+        print(f"\n{'='*80}\n  STEP 3: GET BULK CONTAINER INFO\n{'='*80}")
         print(f"[QUERY {query.query_id}] Calling E-Modal API: get_info_bulk()")
         print(f"[QUERY {query.query_id}] IMPORT containers: {import_count}")
         print(f"[QUERY {query.query_id}] EXPORT containers: {export_count}")
@@ -724,12 +751,10 @@ class QueryService:
         self._extract_timeline_data(filtered_df, bulk_info)
         
         # Save updated filtered file with timeline data
-        filtered_df.to_excel(filtered_file, index=False, engine='openpyxl')
+        filtered_df.to_excel(filtered_file, index=False, engine=EXCEL_WRITE_ENGINE, **EXCEL_WRITE_KWARGS)
         print(f"[QUERY {query.query_id}] Timeline data added to filtered file")
         
-        print(f"\n{'='*80}")
-        print(f"  STEP 4: CHECK APPOINTMENTS")
-        print(f"{'='*80}")
+        print(f"\n{'='*80}\n  STEP 4: CHECK APPOINTMENTS\n{'='*80}")
         print(f"[QUERY {query.query_id}] Processing {len(filtered_df)} containers")
         print(f"[QUERY {query.query_id}] Processing both IMPORT and EXPORT containers")
         print(f"[QUERY {query.query_id}] IMPORT: {import_count}, EXPORT: {export_count}")
@@ -754,53 +779,15 @@ class QueryService:
         stats['failed_checks'] = check_results['failed_count']
         stats['skipped_containers'] = 0  # No longer skipping EXPORT
         
-        print(f"\n{'='*80}")
-        print(f"  STEP 5: GET ALL APPOINTMENTS")
-        print(f"{'='*80}")
+        print(f"\n{'='*80}\n  STEP 5: GET ALL APPOINTMENTS\n{'='*80}")
         print(f"[QUERY {query.query_id}] Calling E-Modal API: get_appointments()")
         print(f"[QUERY {query.query_id}] Timeout: 40 minutes")
         logger.info(f"Getting all appointments for query {query.query_id}")
         
-        # Try to get appointments with retry on session error
-        max_retries = 2
-        for attempt in range(max_retries):
-            try:
-                appointments_response = self.emodal_client.get_appointments(session_id)
-                
-                if appointments_response.get('success'):
-                    break  # Success, exit retry loop
-                
-                error_msg = appointments_response.get('error', '')
-                print(f"[WARNING] Get appointments failed: {error_msg}")
-                
-                # Check if it's a session error (400 Bad Request)
-                if '400' in str(error_msg) or 'BAD REQUEST' in str(error_msg).upper():
-                    if attempt < max_retries - 1:  # Not last attempt
-                        print(f"[INFO] Session appears invalid, creating new session...")
-                        session_id = self._recover_session(user, current_query_id=query.query_id)
-                        print(f"[INFO] New session created: {session_id[:40]}...")
-                        print(f"[INFO] Retrying get_appointments...")
-                        continue
-                
-                # Not a session error or last attempt failed
-                print(f"[ERROR] Failed to get appointments: {error_msg}")
-                raise Exception(f"Failed to get appointments: {error_msg}")
-                
-            except Exception as e:
-                error_msg = str(e)
-                print(f"[ERROR] Exception getting appointments: {error_msg}")
-                
-                # Check if it's a session error
-                if '400' in error_msg or 'BAD REQUEST' in error_msg.upper():
-                    if attempt < max_retries - 1:  # Not last attempt
-                        print(f"[INFO] Session error detected, recovering...")
-                        session_id = self._recover_session(user, current_query_id=query.query_id)
-                        print(f"[INFO] New session: {session_id[:40]}...")
-                        print(f"[INFO] Retrying...")
-                        continue
-                
-                # Not a session error or last attempt
-                raise
+        # Get appointments, recovering the session once on session errors
+        appointments_response, session_id = self._call_with_session_retry(
+            user, session_id, query.query_id, 'get_appointments'
+        )
         
         print(f"[SUCCESS] Appointments retrieved!")
         print(f"[QUERY {query.query_id}] File URL: {appointments_response.get('file_url', '')[:50]}...")
@@ -813,8 +800,8 @@ class QueryService:
         
         # Also update master file
         master_appointments = os.path.join(user.folder_path, 'emodal', 'all_appointments.xlsx')
-        os.makedirs(os.path.dirname(master_appointments), exist_ok=True)
-        shutil.copy(appointments_file, master_appointments)
+        ensure_dir(os.path.dirname(master_appointments))
+        link_or_copy(appointments_file, master_appointments)
         
         stats['total_appointments'] = appointments_response.get('selected_count', 0)
         stats['duration_seconds'] = int(time.time() - start_time)
@@ -836,7 +823,7 @@ class QueryService:
     def _filter_containers(self, containers_file):
         """Filter containers based on Hold and Pregate columns"""
         # Read Excel with keep_default_na=False to preserve "N/A" as strings instead of NaN
-        df = pd.read_excel(containers_file, keep_default_na=False)
+        df = pd.read_excel(containers_file, engine=EXCEL_READ_ENGINE, keep_default_na=False)
         
         # Filter logic: 
         # - Column D (Holds) = "NO" (uppercase)
@@ -845,16 +832,9 @@ class QueryService:
         
         try:
             # Try by column position first
-            # Holds = "NO" (case-insensitive)
-            holds_condition = df.iloc[:, 3].astype(str).str.upper().str.strip() == "NO"
-            
-            # Pregate contains "N/A" (now properly read as string "N/A" instead of NaN)
-            pregate_col = df.iloc[:, 4]
-            pregate_condition = (
-                pregate_col.astype(str).str.upper().str.contains("N/A", regex=False, na=False)
-            )
-            
-            filtered = df[holds_condition & pregate_condition]
+            # Holds = "NO" (case-insensitive), Pregate contains "N/A"
+            # (now properly read as string "N/A" instead of NaN)
+            filtered = df[self._filter_mask(df.iloc[:, 3], df.iloc[:, 4])]
             
             logger.info(f"Filtered by position - Holds='NO' and Pregate contains 'N/A'")
             
@@ -862,12 +842,7 @@ class QueryService:
             logger.warning(f"Failed to filter by position, trying by column names: {e}")
             # Fallback to column names if they exist
             try:
-                holds_condition = df['Holds'].astype(str).str.upper().str.strip() == "NO"
-                pregate_col = df['Pregate Ticket#']
-                pregate_condition = (
-                    pregate_col.astype(str).str.upper().str.contains("N/A", regex=False, na=False)
-                )
-                filtered = df[holds_condition & pregate_condition]
+                filtered = df[self._filter_mask(df['Holds'], df['Pregate Ticket#'])]
                 logger.info(f"Filtered by column names - Holds='NO' and Pregate contains 'N/A'")
             except Exception as e2:
                 logger.error(f"Failed to filter containers: {e2}")
@@ -877,6 +852,65 @@ class QueryService:
         logger.info(f"Filtered {len(filtered)} containers from {len(df)} total")
         return filtered
     
+    @staticmethod
+    def _filter_mask(holds_col, pregate_col):
+        """
+        Boolean mask for Holds == "NO" and Pregate containing "N/A" (case-insensitive)
+        
+        Each column is scanned once over its raw values instead of building
+        intermediate string Series for every .astype/.str step.
+        """
+        count = len(holds_col)
+        holds = np.fromiter(
+            (str(value).strip().upper() == 'NO' for value in holds_col.to_numpy(dtype=object)),
+            dtype=bool, count=count
+        )
+        pregate = np.fromiter(
+            ('N/A' in str(value).upper() for value in pregate_col.to_numpy(dtype=object)),
+            dtype=bool, count=count
+        )
+        return holds & pregate
+    
+    def _plan_checks(self, pending_df, container_nums, trade_types, bulk_info):
+        """
+        Resolve move type and terminal for every pending container up front
+        
+        Same rules as determine_move_type/determine_terminal, evaluated column-wise
+        so the check loop only has to make the API calls.
+        
+        Args:
+            pending_df: DataFrame with the containers still to check
+            container_nums: Normalized container numbers (same order as pending_df)
+            trade_types: Normalized upper-case trade types (same order as pending_df)
+            bulk_info: Dict with pre-fetched pregate/booking info
+        
+        Returns:
+            tuple: (move_types, terminals) lists; terminal is None when the code isn't mapped
+        """
+        def location(column):
+            if column not in pending_df:
+                return np.full(len(pending_df), '', dtype=object)
+            values = pending_df[column].astype(str).str.strip()
+            return values.where(~values.str.upper().isin(['N/A', 'NAN']), '').to_numpy(dtype=object)
+        
+        current_loc = location('Current Loc')
+        destination = location('Destination')
+        origin = location('Origin')
+        pick_codes = np.where(destination != '', destination, current_loc)
+        drop_codes = np.where(origin != '', origin, current_loc)
+        
+        is_import = np.array(trade_types, dtype=object) == 'IMPORT'
+        passed_pregate = np.fromiter(
+            (bool(bulk_info.get(num, {}).get('pregate_status', False)) for num in container_nums),
+            dtype=bool, count=len(container_nums)
+        )
+        move_types = np.where(is_import, np.where(passed_pregate, 'DROP EMPTY', 'PICK FULL'), 'DROP FULL')
+        
+        # Only PICK FULL reads Destination - every other move type is a DROP
+        codes = np.where(move_types == 'PICK FULL', pick_codes, drop_codes)
+        terminals = pd.Series(codes, dtype=object).map(self.TERMINAL_MAPPING)
+        return move_types.tolist(), terminals.where(terminals.notna(), None).tolist()
+    
     def _get_bulk_container_info(self, session_id, filtered_df):
         """
         Get bulk container information (pregate status for IMPORT, booking numbers for EXPORT)
@@ -888,18 +922,11 @@ class QueryService:
         Returns:
             dict: Bulk information results indexed by container number
         """
-        # Separate containers by trade type
-        import_containers = []
-        export_containers = []
-        
-        for idx, row in filtered_df.iterrows():
-            container_num = str(row['Container #']).strip()
-            trade_type = str(row['Trade Type']).strip().upper()
-            
-            if trade_type == 'IMPORT':
-                import_containers.append(container_num)
-            elif trade_type == 'EXPORT':
-                export_containers.append(container_num)
+        # Separate containers by trade type with two boolean masks
+        container_nums = filtered_df['Container #'].astype(str).str.strip()
+        trade_types = filtered_df['Trade Type'].astype(str).str.strip().str.upper()
+        import_containers = container_nums[trade_types.eq('IMPORT')].tolist()
+        export_containers = container_nums[trade_types.eq('EXPORT')].tolist()
         
         logger.info(f"Bulk request: {len(import_containers)} IMPORT, {len(export_containers)} EXPORT containers")
         
@@ -966,309 +993,279 @@ class QueryService:
         success_count = 0
         failed_containers = []
         skipped_containers = []
-        processed_containers = []
+        processed_containers = set()
         
-        # Check for existing progress
-        progress_file = os.path.join(query_folder, 'check_progress.json')
+        # Check for existing progress (one JSON line per processed container)
+        progress_file = os.path.join(query_folder, 'check_progress.jsonl')
         if os.path.exists(progress_file):
             with open(progress_file, 'r') as f:
-                progress = json.load(f)
-                processed_containers = progress.get('processed', [])
+                processed_containers = {json.loads(line)['c'] for line in f if line.strip()}
                 logger.info(f"Resuming from previous run - {len(processed_containers)} already processed")
         
         logger.info(f"Checking {len(filtered_df)} containers ({len(processed_containers)} already done)")
         
+        # Drop already processed containers up front so the loop only sees pending work
+        # (EXPORT containers are processed too - they use booking_number instead of container_id)
+        pending_df = filtered_df
+        if processed_containers:
+            pending_df = filtered_df[~filtered_df['Container #'].astype(str).str.strip().isin(processed_containers)]
+            logger.info(f"Skipping {len(filtered_df) - len(pending_df)} already processed containers")
+        
         # Track actual position in filtered list (not DataFrame index)
         current_position = 0
         
-        for idx, row in filtered_df.iterrows():
-            container_data = row.to_dict()
-            container_num = str(container_data.get('Container #', '')).strip()
-            trade_type = str(container_data.get('Trade Type', '')).strip().upper()
-            
-            # Skip if already processed
-            if container_num in processed_containers:
-                logger.info(f"Skipping already processed container: {container_num}")
-                continue
-            
-            # Increment position for containers we're actually processing
-            current_position += 1
-            
-            # EXPORT containers are now processed (no longer skipped)
-            # They use booking_number instead of container_id
-            
-            # Get bulk info for this container
-            info = bulk_info.get(container_num, {})
-            if not info or not info.get('success'):
-                logger.warning(f"No bulk info for {container_num}, skipping")
-                failed_containers.append(container_num)
-                processed_containers.append(container_num)
-                self._save_progress(progress_file, processed_containers)
-                continue
-            
-            print(f"\n[{current_position}/{len(filtered_df)}] Processing container: {container_num} ({trade_type})")
-            logger.info(f"Checking container {current_position}/{len(filtered_df)}: {container_num} ({trade_type})")
-            print(f"  > Pregate status from bulk: {info.get('pregate_status')}")
-            logger.info(f"  Pregate status from bulk: {info.get('pregate_status')}")
-            
-            # Debug: Show available columns for this container
-            if trade_type == 'IMPORT':
-                print(f"  > Available columns: {list(container_data.keys())}")
-                print(f"  > Line column value: '{container_data.get('Line', 'NOT_FOUND')}'")
-                print(f"  > Size Type column value: '{container_data.get('Size Type', 'NOT_FOUND')}'")
+        # Same trucking company for every container - resolve it once
+        trucking_company = determine_trucking_company(None, self.TRUCKING_COMPANIES)
+        
+        # Normalize the key columns once and build all row dicts in a single pass
+        container_nums = pending_df['Container #'].astype(str).str.strip().tolist()
+        trade_types = pending_df['Trade Type'].astype(str).str.strip().str.upper().tolist()
+        
+        last_checkpoint = time.monotonic()
+        move_types, terminals = self._plan_checks(pending_df, container_nums, trade_types, bulk_info)
+        rows = pending_df.to_dict('records')
+        row_index = self._container_row_index(filtered_df)
+        check_params_list = [
+            self._build_check_params(session_id, *job, bulk_info.get(job[0], {}), trucking_company)
+            for job in zip(container_nums, trade_types, rows, move_types, terminals)
+        ]
+        
+        # With bulk checks on, appointments for the next BULK_CHECK_CHUNK containers
+        # are checked in one request; the loop then only handles the results
+        bulk_checks = self.bulk_checks
+        prefetched = {}
+        prefetch_until = 0
+        
+        # check_appointments calls share one session and run one at a time,
+        # but screenshot downloads don't - run them in the background so the
+        # next container's check starts right away
+        downloads = []
+        download_executor = ThreadPoolExecutor(max_workers=self.SCREENSHOT_DOWNLOAD_WORKERS)
+        
+        try:
+            for index, (container_data, container_num, trade_type, move_type, terminal) in enumerate(zip(
+                rows, container_nums, trade_types, move_types, terminals
+            )):
+                if bulk_checks and index >= prefetch_until:
+                    prefetch_until = index + self.BULK_CHECK_CHUNK
+                    prefetched = self._bulk_check(
+                        session_id, container_nums[index:prefetch_until], check_params_list[index:prefetch_until]
+                    )
+                    if prefetched is None:  # Server has no bulk endpoint
+                        bulk_checks = False
+                        prefetched = {}
                 
-                # Check for alternative column names
-                for col_name in container_data.keys():
-                    if 'equip' in col_name.lower() or 'size' in col_name.lower():
-                        print(f"  > Found potential equip column '{col_name}': '{container_data[col_name]}'")
+                # Increment position for containers we're actually processing
+                current_position += 1
                 
-                # Show all column values for debugging
-                print(f"  > All column values:")
-                for col, val in container_data.items():
-                    if col not in ['Container #', 'Trade Type']:  # Skip common columns
-                        print(f"    {col}: '{val}'")
-            
-            # Determine move type using bulk pregate status
-            mock_timeline = {
-                'success': True,
-                'passed_pregate': info.get('pregate_status', False)
-            }
-            move_type = determine_move_type(container_data, mock_timeline)
-            print(f"  > Move Type: {move_type}")
-            logger.info(f"  Move Type: {move_type}")
-            
-            # Determine terminal (needs move_type)
-            print(f"  > Determining terminal...")
-            terminal = determine_terminal(container_data, self.TERMINAL_MAPPING, move_type)
-            if not terminal:
-                logger.warning(f"Could not determine terminal for {container_num}")
-                failed_containers.append(container_num)
-                processed_containers.append(container_num)
-                self._save_progress(progress_file, processed_containers)
-                continue
-            
-            # Determine trucking company
-            trucking_company = determine_trucking_company(container_data, self.TRUCKING_COMPANIES)
-            
-            print(f"  > Terminal: {terminal}")
-            print(f"  > Trucking: {trucking_company}")
-            logger.info(f"  Terminal: {terminal}, Move Type: {move_type}, Trucking: {trucking_company}")
-            
-            # Check appointments with session retry
-            print(f"  > Calling check_appointments API...")
-            print(f"  > Container type: {trade_type}")
-            
-            # Extract timeline dates for IMPORT containers
-            manifested_date = None
-            departed_date = None
-            last_free_day_date = None
-            if trade_type == 'IMPORT':
-                timeline = info.get('timeline', [])
-                if timeline and isinstance(timeline, list):
-                    manifested_date = extract_milestone_date(timeline, 'Manifested')
-                    departed_date = extract_milestone_date(timeline, 'Departed Terminal')
-                    last_free_day_date = extract_milestone_date(timeline, 'Last Free Day')
-                    
-                    # Only use dates if they are actual dates (not "Not Found" or "null")
-                    if manifested_date in ['Not Found', 'null', 'N/A']:
-                        manifested_date = None
-                    if departed_date in ['Not Found', 'null', 'N/A']:
-                        departed_date = None
-                    if last_free_day_date in ['Not Found', 'null', 'N/A']:
-                        last_free_day_date = None
-                    
-                    if manifested_date:
-                        print(f"  > Manifested Date: {manifested_date}")
-                    if departed_date:
-                        print(f"  > Departed Date: {departed_date}")
-                    if last_free_day_date:
-                        print(f"  > Last Free Day: {last_free_day_date}")
-            
-            # Prepare request based on container type
-            if trade_type == 'EXPORT':
-                # EXPORT: needs booking_number from bulk_info
-                booking_number = info.get('booking_number')
-                if not booking_number:
-                    print(f"  > [ERROR] No booking number found in bulk_info for EXPORT container")
+                # Get bulk info for this container
+                info = bulk_info.get(container_num, {})
+                if not info or not info.get('success'):
+                    logger.warning("No bulk info for %s, skipping", container_num)
                     failed_containers.append(container_num)
-                    processed_containers.append(container_num)
-                    self._save_progress(progress_file, processed_containers)
+                    processed_containers.add(container_num)
+                    self._save_progress(progress_file, container_num)
                     continue
-                print(f"  > Booking number: {booking_number}")
-            
-            appointment_response = None
-            max_check_retries = 2
-            
-            for check_attempt in range(max_check_retries):
-                try:
-                    # Build request parameters based on container type
-                    check_params = {
-                        'session_id': session_id,
-                        'container_type': trade_type.lower(),  # 'import' or 'export'
-                        'trucking_company': trucking_company,
-                        'terminal': terminal,
-                        'move_type': move_type,
-                        'truck_plate': 'ABC123',
-                        'container_number': container_num  # For screenshot annotation
-                    }
-                    
-                    # Add type-specific parameters
-                    if trade_type == 'IMPORT':
-                        check_params['container_id'] = container_num
-                        # Add timeline dates for IMPORT containers
-                        if manifested_date:
-                            check_params['manifested_date'] = manifested_date
-                        if departed_date:
-                            check_params['departed_date'] = departed_date
-                        if last_free_day_date:
-                            check_params['last_free_day_date'] = last_free_day_date
-                        
-                        # Add line and equip_size for IMPORT containers
-                        line = str(container_data.get('Line', '')).strip()
-                        equip_size = str(container_data.get('Size Type', '')).strip()  # Changed from 'Equip Size' to 'Size Type'
-                        
-                        print(f"  > Line: '{line}' (from Excel column K)")
-                        print(f"  > Size Type: '{equip_size}' (from Excel column O)")
-                        
-                        if line and line != '' and line.lower() != 'nan':
-                            check_params['line'] = line
-                            print(f"  > Adding line to request: {line}")
-                        else:
-                            print(f"  > Line not added (empty or 'nan')")
-                            
-                        if equip_size and equip_size != '' and equip_size.lower() != 'nan':
-                            check_params['equip_size'] = equip_size
-                            print(f"  > Adding equip_size to request: {equip_size}")
-                        else:
-                            print(f"  > Size Type not added (empty or 'nan')")
-                    else:  # EXPORT
-                        check_params['container_id'] = container_num  # Container number
-                        check_params['booking_number'] = booking_number  # Booking number
-                    
-                    # Debug: Show final payload being sent
-                    print(f"  > Final payload keys: {list(check_params.keys())}")
-                    if 'line' in check_params:
-                        print(f"  > Payload includes line: {check_params['line']}")
-                    if 'equip_size' in check_params:
-                        print(f"  > Payload includes equip_size: {check_params['equip_size']}")
-                    
-                    appointment_response = self.emodal_client.check_appointments(**check_params)
-                    # Success - exit retry loop
-                    break
-                    
-                except Exception as e:
-                    error_msg = str(e)
-                    print(f"  > [ERROR] {error_msg}")
-                    
-                    # Check if it's a session error (400 Bad Request)
-                    if ('400' in error_msg or 'BAD REQUEST' in error_msg.upper()) and check_attempt < max_check_retries - 1:
-                        print(f"  > [SESSION ERROR] Recovering session...")
-                        new_session_id = self._recover_session(user, current_query_id=current_query_id)
-                        if new_session_id:
-                            session_id = new_session_id
-                            print(f"  > [RETRY] Retrying with new session for {container_num}...")
-                            continue  # Retry
-                    
-                    # Not a session error or last attempt - log and skip
-                    logger.error(f"Failed to check appointments for {container_num}: {e}")
-                    break  # Exit retry loop
-            
-            try:
                 
-                # Check if we got a response
-                if not appointment_response:
-                    print(f"  > [FAILED] No response received after retries")
+                print(f"\n[{current_position}/{len(filtered_df)}] Processing container: {container_num} ({trade_type})")
+                logger.info("Checking container %s/%s: %s (%s)", current_position, len(filtered_df), container_num, trade_type)
+                print(f"  > Pregate status from bulk: {info.get('pregate_status')}")
+                logger.info("  Pregate status from bulk: %s", info.get('pregate_status'))
+                
+                # Debug: Show the row's columns (one record instead of ~20 console lines per container)
+                if trade_type == 'IMPORT' and logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("[%s] Line=%r, Size Type=%r, all columns: %s", container_num,
+                                 container_data.get('Line', 'NOT_FOUND'), container_data.get('Size Type', 'NOT_FOUND'),
+                                 {col: val for col, val in container_data.items() if col not in ('Container #', 'Trade Type')})
+                
+                # Move type and terminal were resolved for all containers before the loop
+                print(f"  > Move Type: {move_type}")
+                logger.info("  Move Type: %s", move_type)
+                
+                if not terminal:
+                    logger.warning("Could not determine terminal for %s", container_num)
                     failed_containers.append(container_num)
-                    processed_containers.append(container_num)
-                    self._save_progress(progress_file, processed_containers)
+                    processed_containers.add(container_num)
+                    self._save_progress(progress_file, container_num)
                     continue
                 
-                # Save response
-                timestamp = int(time.time())
-                response_path = os.path.join(
-                    query_folder,
-                    'containers_checking_attempts',
-                    'responses',
-                    f"{container_num}_{timestamp}.json"
-                )
-                os.makedirs(os.path.dirname(response_path), exist_ok=True)
+                print(f"  > Terminal: {terminal}")
+                print(f"  > Trucking: {trucking_company}")
+                logger.info("  Terminal: %s, Move Type: %s, Trucking: %s", terminal, move_type, trucking_company)
                 
-                with open(response_path, 'w') as f:
-                    json.dump({
-                        'container_data': container_data,
-                        'bulk_info': info,
-                        'appointment_check': appointment_response,
-                        'terminal': terminal,
-                        'move_type': move_type,
-                        'trucking_company': trucking_company,
-                        'timestamp': timestamp
-                    }, f, indent=2)
+                # Check appointments with session retry
+                print(f"  > Calling check_appointments API...")
+                print(f"  > Container type: {trade_type}")
+                
+                # Request parameters were built for all containers before the loop -
+                # the only way to get None past the checks above is a missing booking number
+                check_params = check_params_list[index]
+                if check_params is None:
+                    print(f"  > [ERROR] No booking number found in bulk_info for EXPORT container")
+                    failed_containers.append(container_num)
+                    processed_containers.add(container_num)
+                    self._save_progress(progress_file, container_num)
+                    continue
                 
-                # Download screenshot based on container type
                 if trade_type == 'IMPORT':
-                    screenshot_url = appointment_response.get('dropdown_screenshot_url')
-                else:  # EXPORT
-                    screenshot_url = appointment_response.get('calendar_screenshot_url')
+                    if check_params.get('manifested_date'):
+                        print(f"  > Manifested Date: {check_params['manifested_date']}")
+                    if check_params.get('departed_date'):
+                        print(f"  > Departed Date: {check_params['departed_date']}")
+                    if check_params.get('last_free_day_date'):
+                        print(f"  > Last Free Day: {check_params['last_free_day_date']}")
+                    
+                    if 'line' in check_params:
+                        print(f"  > Adding line to request: {check_params['line']}")
+                    else:
+                        print(f"  > Line not added (empty or 'nan')")
+                    if 'equip_size' in check_params:
+                        print(f"  > Adding equip_size to request: {check_params['equip_size']}")
+                    else:
+                        print(f"  > Size Type not added (empty or 'nan')")
+                else:
+                    print(f"  > Booking number: {check_params['booking_number']}")
                 
-                if screenshot_url:
-                    screenshot_path = os.path.join(
+                # Result from a bulk check, if one covered this container
+                appointment_response = prefetched.pop(container_num, None)
+                if appointment_response is not None:
+                    print(f"  > Using result from bulk appointment check")
+                max_check_retries = 2 if appointment_response is None else 0
+                
+                for check_attempt in range(max_check_retries):
+                    try:
+                        check_params['session_id'] = session_id  # May have changed after a recovery
+                        
+                        logger.debug("Final payload keys: %s", list(check_params))
+                        
+                        appointment_response = self.emodal_client.check_appointments(**check_params)
+                        # Success - exit retry loop
+                        break
+                        
+                    except Exception as e:
+                        error_msg = str(e)
+                        print(f"  > [ERROR] {error_msg}")
+                        
+                        # Check if it's a session error (400 Bad Request)
+                        if self._is_bad_request(error_msg) and check_attempt < max_check_retries - 1:
+                            print(f"  > [SESSION ERROR] Recovering session...")
+                            new_session_id = self._recover_session(user, current_query_id=current_query_id)
+                            if new_session_id:
+                                session_id = new_session_id
+                                print(f"  > [RETRY] Retrying with new session for {container_num}...")
+                                continue  # Retry
+                        
+                        # Not a session error or last attempt - log and skip
+                        logger.error("Failed to check appointments for %s: %s", container_num, e)
+                        break  # Exit retry loop
+                
+                try:
+                    
+                    # Check if we got a response
+                    if not appointment_response:
+                        print(f"  > [FAILED] No response received after retries")
+                        failed_containers.append(container_num)
+                        processed_containers.add(container_num)
+                        self._save_progress(progress_file, container_num)
+                        continue
+                    
+                    # Save response
+                    timestamp = int(time.time())
+                    response_path = os.path.join(
                         query_folder,
                         'containers_checking_attempts',
-                        'screenshots',
-                        f"{container_num}_{timestamp}.png"
+                        'responses',
+                        f"{container_num}_{timestamp}.json"
                     )
-                    os.makedirs(os.path.dirname(screenshot_path), exist_ok=True)
-                    self.emodal_client.download_file(screenshot_url, screenshot_path)
-                    print(f"  > Screenshot saved: {screenshot_path}")
-                
-                if appointment_response.get('success'):
-                    success_count += 1
                     
-                    # Different success criteria for IMPORT vs EXPORT
+                    with open(response_path, 'wb') as f:
+                        f.write(_dumps({
+                            'container_number': container_num,  # Row lives in filtered_containers.xlsx
+                            'bulk_info': info,
+                            'appointment_check': appointment_response,
+                            'terminal': terminal,
+                            'move_type': move_type,
+                            'trucking_company': trucking_company,
+                            'timestamp': timestamp
+                        }))
+                    
+                    # Download screenshot based on container type
                     if trade_type == 'IMPORT':
-                        slots = len(appointment_response.get('available_times', []))
-                        print(f"  > [SUCCESS] Appointments checked - {slots} available slots")
-                        logger.info(f"Container {container_num} (IMPORT) check successful - {slots} slots")
-                        
-                        # Extract and update appointment dates in filtered_df
-                        self._update_appointment_dates(
-                            filtered_df, 
-                            container_num, 
-                            appointment_response.get('available_times', []),
-                            move_type
-                        )
+                        screenshot_url = appointment_response.get('dropdown_screenshot_url')
                     else:  # EXPORT
-                        calendar_found = appointment_response.get('calendar_found', False)
-                        if calendar_found:
-                            print(f"  > [SUCCESS] Calendar available for booking")
-                            logger.info(f"Container {container_num} (EXPORT) check successful - calendar available")
-                        else:
-                            print(f"  > [WARNING] Calendar not found")
-                            logger.warning(f"Container {container_num} (EXPORT) - calendar not found")
-                else:
+                        screenshot_url = appointment_response.get('calendar_screenshot_url')
+                    
+                    if screenshot_url:
+                        screenshot_path = os.path.join(
+                            query_folder,
+                            'containers_checking_attempts',
+                            'screenshots',
+                            f"{container_num}_{timestamp}.png"
+                        )
+                        downloads.append((container_num, download_executor.submit(
+                            self.emodal_client.download_file, screenshot_url, screenshot_path
+                        )))
+                        print(f"  > Screenshot download started: {screenshot_path}")
+                    
+                    if appointment_response.get('success'):
+                        success_count += 1
+                        
+                        # Different success criteria for IMPORT vs EXPORT
+                        if trade_type == 'IMPORT':
+                            slots = len(appointment_response.get('available_times', []))
+                            print(f"  > [SUCCESS] Appointments checked - {slots} available slots")
+                            logger.info("Container %s (IMPORT) check successful - %s slots", container_num, slots)
+                            
+                            # Extract and update appointment dates in filtered_df
+                            self._update_appointment_dates(
+                                filtered_df, 
+                                container_num, 
+                                appointment_response.get('available_times', []),
+                                move_type,
+                                row_index
+                            )
+                        else:  # EXPORT
+                            calendar_found = appointment_response.get('calendar_found', False)
+                            if calendar_found:
+                                print(f"  > [SUCCESS] Calendar available for booking")
+                                logger.info("Container %s (EXPORT) check successful - calendar available", container_num)
+                            else:
+                                print(f"  > [WARNING] Calendar not found")
+                                logger.warning("Container %s (EXPORT) - calendar not found", container_num)
+                    else:
+                        failed_containers.append(container_num)
+                        print(f"  > [FAILED] {appointment_response.get('error')}")
+                        logger.warning("Container %s check failed: %s", container_num, appointment_response.get('error'))
+                    
+                except Exception as e:
                     failed_containers.append(container_num)
-                    print(f"  > [FAILED] {appointment_response.get('error')}")
-                    logger.warning(f"Container {container_num} check failed: {appointment_response.get('error')}")
+                    logger.error("Failed to check appointments for %s: %s", container_num, e)
                 
-            except Exception as e:
-                failed_containers.append(container_num)
-                logger.error(f"Failed to check appointments for {container_num}: {e}")
-            
-            # Mark as processed
-            processed_containers.append(container_num)
-            self._save_progress(progress_file, processed_containers)
-            
-            # Save progress to filtered Excel file every 5 containers
-            if len(processed_containers) % 5 == 0:
-                try:
-                    filtered_df.to_excel(filtered_file, index=False, engine='openpyxl')
-                    print(f"  > Progress saved: {len(processed_containers)}/{len(filtered_df)} containers")
-                except Exception as e:
-                    logger.error(f"Failed to save progress to Excel: {e}")
+                # Mark as processed
+                processed_containers.add(container_num)
+                self._save_progress(progress_file, container_num)
+                
+                # Checkpoint the filtered Excel file on a timer - each write rewrites the
+                # whole sheet, so a per-N-containers cadence made large queries quadratic.
+                # check_progress.jsonl remains the resume record
+                if time.monotonic() - last_checkpoint >= self.EXCEL_CHECKPOINT_INTERVAL:
+                    try:
+                        filtered_df.to_excel(filtered_file, index=False, engine=EXCEL_WRITE_ENGINE, **EXCEL_WRITE_KWARGS)
+                        print(f"  > Progress saved: {len(processed_containers)}/{len(filtered_df)} containers")
+                    except Exception as e:
+                        logger.error("Failed to save progress to Excel: %s", e)
+                    last_checkpoint = time.monotonic()
+        finally:
+            # Wait for screenshot downloads still in flight (also when the loop raises)
+            download_executor.shutdown(wait=True)
+        
+        for container_num, future in downloads:
+            if future.exception():
+                logger.error("Failed to download screenshot for %s: %s", container_num, future.exception())
         
         # Final save to filtered Excel file
         try:
-            filtered_df.to_excel(filtered_file, index=False, engine='openpyxl')
+            filtered_df.to_excel(filtered_file, index=False, engine=EXCEL_WRITE_ENGINE, **EXCEL_WRITE_KWARGS)
             print(f"[SUCCESS] Final data saved to filtered Excel file")
         except Exception as e:
             logger.error(f"Failed to save final data to Excel: {e}")
@@ -1281,28 +1278,167 @@ class QueryService:
             'skipped_count': 0  # No longer skipping EXPORT
         }
     
-    def _save_progress(self, progress_file, processed_containers):
-        """Save progress to file for resume capability"""
+    def _build_check_params(self, session_id, container_num, trade_type, container_data, move_type,
+                            terminal, info, trucking_company):
+        """
+        Build check_appointments keyword arguments for one container
+        
+        Args:
+            session_id: Active session ID
+            container_num: Normalized container number
+            trade_type: Normalized upper-case trade type
+            container_data: Dict with the filtered Excel row
+            move_type: Move type from _plan_checks
+            terminal: Terminal from _plan_checks (None if not mapped)
+            info: This container's entry in bulk_info
+            trucking_company: Trucking company name
+        
+        Returns:
+            dict, or None if the container can't be checked (no bulk info,
+            no terminal, or an EXPORT container without booking number)
+        """
+        if not info or not info.get('success') or not terminal:
+            return None
+        
+        check_params = {
+            'session_id': session_id,
+            'container_type': trade_type.lower(),  # 'import' or 'export'
+            'trucking_company': trucking_company,
+            'terminal': terminal,
+            'move_type': move_type,
+            'truck_plate': 'ABC123',
+            'container_id': container_num,
+            'container_number': container_num  # For screenshot annotation
+        }
+        
+        if trade_type == 'IMPORT':
+            # Add timeline dates - only actual dates (not "Not Found" or "null")
+            timeline = info.get('timeline', [])
+            if timeline and isinstance(timeline, list):
+                for param, milestone in (('manifested_date', 'Manifested'),
+                                         ('departed_date', 'Departed Terminal'),
+                                         ('last_free_day_date', 'Last Free Day')):
+                    date = extract_milestone_date(timeline, milestone)
+                    if date and date not in ('Not Found', 'null', 'N/A'):
+                        check_params[param] = date
+            
+            # Add line and equip_size (Excel columns K and O)
+            line = str(container_data.get('Line', '')).strip()
+            equip_size = str(container_data.get('Size Type', '')).strip()
+            if line and line.lower() != 'nan':
+                check_params['line'] = line
+            if equip_size and equip_size.lower() != 'nan':
+                check_params['equip_size'] = equip_size
+        else:  # EXPORT
+            booking_number = info.get('booking_number')
+            if not booking_number:
+                return None
+            check_params['booking_number'] = booking_number
+        
+        return check_params
+    
+    def _bulk_check(self, session_id, container_nums, check_params_list):
+        """
+        Check appointments for a slice of containers with one bulk request
+        
+        Args:
+            session_id: Active session ID
+            container_nums: Container numbers of the slice
+            check_params_list: Matching _build_check_params results (None entries are skipped)
+        
+        Returns:
+            dict: container number -> appointment response, or None if the
+            server has no bulk endpoint. Containers missing from the dict
+            (failed request, session errors) are checked one by one.
+        """
+        jobs = [(num, params) for num, params in zip(container_nums, check_params_list) if params]
+        if not jobs:
+            return {}
+        
+        print(f"  > Bulk appointment check for {len(jobs)} containers...")
+        try:
+            results = self.emodal_client.check_appointments_bulk(
+                session_id,
+                [{key: value for key, value in params.items() if key != 'session_id'} for _, params in jobs]
+            )
+        except Exception as e:
+            logger.warning("Bulk appointment check failed, checking containers one by one: %s", e)
+            return {}
+        if results is None:
+            return None
+        
+        prefetched = {}
+        for (container_num, _), response in zip(jobs, results):
+            if isinstance(response, dict) and not self._is_session_error(response.get('error') or ''):
+                prefetched[container_num] = response
+        return prefetched
+    
+    def _save_progress(self, progress_file, container_num):
+        """Append a processed container to the progress log for resume capability"""
         try:
-            os.makedirs(os.path.dirname(progress_file), exist_ok=True)
-            with open(progress_file, 'w') as f:
-                json.dump({
-                    'processed': processed_containers,
-                    'last_updated': time.time()
-                }, f, indent=2)
+            ensure_dir(os.path.dirname(progress_file))
+            with open(progress_file, 'a') as f:
+                f.write(json.dumps({'c': container_num, 't': time.time()}) + '\n')
         except Exception as e:
             logger.error(f"Failed to save progress: {e}")
     
+    @staticmethod
+    def _is_bad_request(error_msg):
+        """Check if error is the 400 Bad Request E-Modal returns for an expired session"""
+        error_msg = str(error_msg)
+        return '400' in error_msg or 'BAD REQUEST' in error_msg.upper()
+    
+    def _call_with_session_retry(self, user, session_id, query_id, method_name, max_retries=2):
+        """
+        Call a session-scoped EModalClient read, recovering the session on 400 errors
+        
+        Args:
+            user: User object
+            session_id: Active session ID
+            query_id: Query ID (lets session recovery cancel for a newer query)
+            method_name: EModalClient method taking only session_id (e.g. 'get_containers')
+            max_retries: Maximum number of attempts (default: 2)
+        
+        Returns:
+            tuple: (response, session_id) - session_id changes if it was recovered
+        
+        Raises:
+            Exception: If the call fails with a non-session error or on the last attempt
+        """
+        action = method_name.replace('_', ' ')  # e.g. 'get containers'
+        for attempt in range(1, max_retries + 1):
+            try:
+                response = getattr(self.emodal_client, method_name)(session_id)
+            except Exception as e:
+                error_msg = str(e)
+                print(f"[ERROR] Exception on {action}: {error_msg}")
+                if attempt == max_retries or not self._is_bad_request(error_msg):
+                    raise
+            else:
+                if response.get('success'):
+                    return response, session_id
+                error_msg = str(response.get('error', ''))
+                print(f"[WARNING] {action.capitalize()} failed: {error_msg}")
+                if attempt == max_retries or not self._is_bad_request(error_msg):
+                    print(f"[ERROR] Failed to {action}: {error_msg}")
+                    raise Exception(f"Failed to {action}: {error_msg}")
+            
+            # Session error - recover, back off briefly and retry
+            print(f"[INFO] Session appears invalid, creating new session...")
+            new_session_id = self._recover_session(user, current_query_id=query_id)
+            if not new_session_id:
+                raise Exception(f"Failed to {action}: session recovery failed ({error_msg})")
+            session_id = new_session_id
+            print(f"[INFO] New session created: {session_id[:40]}...")
+            time.sleep(_backoff_delay(attempt, base=1.0))
+            print(f"[INFO] Retrying {method_name}...")
+        
+        # Should not reach here
+        raise Exception(f"Failed to {action}: maximum retries exceeded")
+    
     def _is_session_error(self, error_msg):
         """Check if error indicates session expiration"""
-        session_errors = [
-            '400 Client Error: BAD REQUEST',
-            '401',
-            'Unauthorized',
-            'Invalid session',
-            'Session expired'
-        ]
-        return any(err in str(error_msg) for err in session_errors)
+        return self.SESSION_ERROR_RE.search(str(error_msg)) is not None
     
     def _recover_session(self, user, max_retries=3, retry_delay_minutes=10, current_query_id=None):
         """
@@ -1317,12 +1453,13 @@ class QueryService:
         Returns:
             session_id or None
         """
+        # The old session is dead - make sure get_session doesn't hand it back
+        if user.session_id:
+            self.emodal_client.forget_session(user.session_id)
+        
         # Load credentials once
         try:
-            cred_file = os.path.join(user.folder_path, 'user_cre_env.json')
-            with open(cred_file, 'r') as f:
-                creds = json.load(f)
-            emodal_creds = creds.get('emodal', {})
+            emodal_creds = self._get_emodal_credentials(user)
         except Exception as e:
             logger.error(f"Failed to load credentials: {e}")
             return None
@@ -1427,9 +1564,10 @@ class QueryService:
     def _extract_timeline_data(self, filtered_df, bulk_info):
         """Extract timeline milestones from bulk_info and update filtered_df"""
         updated_count = 0
-        for idx, row in filtered_df.iterrows():
-            container_num = str(row.get('Container #', '')).strip()
-            trade_type = str(row.get('Trade Type', '')).strip().upper()
+        rows = zip(filtered_df.index, filtered_df['Container #'], filtered_df['Trade Type'])
+        for idx, container_num, trade_type in rows:
+            container_num = str(container_num).strip()
+            trade_type = str(trade_type).strip().upper()
             
             # Only process IMPORT containers (EXPORT get N/A)
             if trade_type == 'IMPORT':
@@ -1448,46 +1586,58 @@ class QueryService:
                     filtered_df.at[idx, 'Empty Received'] = empty_received
                     
                     updated_count += 1
-                    logger.info(f"[{container_num}] Timeline updated: Manifested={manifested}, Departed={departed_terminal}, Empty={empty_received}")
+                    logger.info("[%s] Timeline updated: Manifested=%s, Departed=%s, Empty=%s", container_num, manifested, departed_terminal, empty_received)
                 else:
-                    logger.warning(f"[{container_num}] No timeline data in bulk_info")
+                    logger.warning("[%s] No timeline data in bulk_info", container_num)
         
         print(f"  > Updated timeline data for {updated_count} IMPORT containers")
-        logger.info(f"Extracted timeline data for {updated_count} IMPORT containers")
+        logger.info("Extracted timeline data for %s IMPORT containers", updated_count)
     
-    def _update_appointment_dates(self, filtered_df, container_num, available_times, move_type):
-        """Update appointment dates in filtered_df based on move type"""
+    @staticmethod
+    def _container_row_index(filtered_df):
+        """Map normalized container number -> filtered_df row label (None if the number repeats)"""
+        container_nums = filtered_df['Container #'].astype(str).str.strip()
+        row_index = dict(zip(container_nums, filtered_df.index))
+        for container_num in container_nums[container_nums.duplicated()]:
+            row_index[container_num] = None
+        return row_index
+    
+    def _update_appointment_dates(self, filtered_df, container_num, available_times, move_type, row_index):
+        """
+        Update appointment dates in filtered_df based on move type
+        
+        row_index comes from _container_row_index, so each update is a
+        scalar write instead of a full-column string comparison.
+        """
         # Find the earliest appointment date (returns "Not Found" if empty/None)
         earliest_date = find_earliest_appointment(available_times)
         
-        # Find the row for this container
-        container_mask = filtered_df['Container #'].astype(str).str.strip() == container_num
-        
         # Validate that we found exactly one container
-        matched_count = container_mask.sum()
-        if matched_count == 0:
-            logger.error(f"Container {container_num} not found in DataFrame!")
+        if container_num not in row_index:
+            logger.error("Container %s not found in DataFrame!", container_num)
             return
-        elif matched_count > 1:
-            logger.error(f"Multiple rows found for container {container_num}!")
+        idx = row_index[container_num]
+        if idx is None:
+            logger.error("Multiple rows found for container %s!", container_num)
             return
         
         # Log what we're updating
-        logger.debug(f"Updating appointment for {container_num}: move_type={move_type}, earliest={earliest_date}, slots={len(available_times) if available_times else 0}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Updating appointment for %s: move_type=%s, earliest=%s, slots=%s", container_num, move_type, earliest_date, len(available_times) if available_times else 0)
         
         # Update based on move type
         if move_type == 'PICK FULL':
             # Update "Before" field with date or "Not Found"
-            filtered_df.loc[container_mask, 'First Appointment Available (Before)'] = earliest_date
+            filtered_df.at[idx, 'First Appointment Available (Before)'] = earliest_date
             # Set "After" field to "N/A" (doesn't apply to PICK FULL)
-            filtered_df.loc[container_mask, 'First Appointment Available (After)'] = 'N/A'
-            logger.info(f"[{container_num}] Updated BEFORE: {earliest_date}")
+            filtered_df.at[idx, 'First Appointment Available (After)'] = 'N/A'
+            logger.info("[%s] Updated BEFORE: %s", container_num, earliest_date)
         elif move_type == 'DROP EMPTY':
             # Set "Before" field to "N/A" (doesn't apply to DROP EMPTY)
-            filtered_df.loc[container_mask, 'First Appointment Available (Before)'] = 'N/A'
+            filtered_df.at[idx, 'First Appointment Available (Before)'] = 'N/A'
             # Update "After" field with date or "Not Found"
-            filtered_df.loc[container_mask, 'First Appointment Available (After)'] = earliest_date
-            logger.info(f"[{container_num}] Updated AFTER: {earliest_date}")
+            filtered_df.at[idx, 'First Appointment Available (After)'] = earliest_date
+            logger.info("[%s] Updated AFTER: %s", container_num, earliest_date)
     
     def _get_query_folder_path(self, user_id, query_id):
         """Generate query folder path"""
@@ -1,5 +1,6 @@
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import logging
 
@@ -26,23 +27,44 @@ class SchedulerService:
         logger.info("Scheduler started - running queries every 120 minutes (2 hours)")
     
     def run_scheduled_queries(self):
-        """Execute queries for all users with schedule enabled"""
+        """
+        Execute queries for all users with schedule enabled
+        
+        Every user has their own E-Modal session, so their queries are
+        independent and run in parallel (SCHEDULER_MAX_PARALLEL_QUERIES).
+        Calls within one query stay sequential - they share a session.
+        """
         from models import User
         
         # Run within application context
         with self.app.app_context():
             logger.info("Running scheduled queries...")
             
-            users = User.query.filter_by(schedule_enabled=True).all()
-            logger.info(f"Found {len(users)} users with scheduling enabled")
-            
-            for user in users:
-                try:
-                    logger.info(f"Starting query for user {user.username}")
-                    query_id = self.query_service.execute_query(user)
-                    logger.info(f"Query {query_id} completed for user {user.username}")
-                except Exception as e:
-                    logger.error(f"Failed to execute query for user {user.username}: {e}")
+            user_ids = [user.id for user in User.query.filter_by(schedule_enabled=True).all()]
+            logger.info(f"Found {len(user_ids)} users with scheduling enabled")
+        
+        if not user_ids:
+            return
+        
+        max_workers = min(len(user_ids), self.app.config.get('SCHEDULER_MAX_PARALLEL_QUERIES', 4))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            # Wait for every user; errors are logged per user inside the worker
+            list(executor.map(self._run_user_query, user_ids))
+    
+    def _run_user_query(self, user_id):
+        """Run one scheduled query in its own app context (and DB session)"""
+        from models import User
+        
+        with self.app.app_context():
+            user = User.query.get(user_id)
+            if not user:
+                return
+            try:
+                logger.info(f"Starting query for user {user.username}")
+                query_id = self.query_service.execute_query(user)
+                logger.info(f"Query {query_id} completed for user {user.username}")
+            except Exception as e:
+                logger.error(f"Failed to execute query for user {user.username}: {e}")
     
     def reschedule_after_manual_query(self):
         """Reschedule next query to run 2 hours from now after a manual query"""
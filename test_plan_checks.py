@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Test Script for QueryService._plan_checks
+
+_plan_checks resolves move type and terminal for all pending containers
+column-wise, while get_check still uses the per-row helpers
+(determine_move_type / determine_terminal). This script runs both over the
+same rows - including NaN, blank, 'N/A', unmapped codes and unknown trade
+types - and asserts they agree.
+
+Run with: python test_plan_checks.py  (or: python -m pytest test_plan_checks.py)
+"""
+
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from services.query_service import (
+    determine_terminal,
+    determine_move_type,
+    QueryService
+)
+
+ROWS = [
+    # Plain IMPORT / EXPORT with mapped codes
+    {'Container #': 'MSCU0000001', 'Trade Type': 'IMPORT', 'Origin': 'ITS', 'Destination': 'PCT', 'Current Loc': 'TTI'},
+    {'Container #': 'MSCU0000002', 'Trade Type': 'EXPORT', 'Origin': 'ITS', 'Destination': 'PCT', 'Current Loc': 'TTI'},
+    # Lower-case / padded trade types
+    {'Container #': ' MSCU0000003 ', 'Trade Type': ' import ', 'Origin': 'WUT', 'Destination': 'T18', 'Current Loc': 'FIT'},
+    {'Container #': 'MSCU0000004', 'Trade Type': 'export', 'Origin': 'WUT', 'Destination': 'T18', 'Current Loc': 'FIT'},
+    # Unknown, blank and missing trade types
+    {'Container #': 'MSCU0000005', 'Trade Type': 'DOMESTIC', 'Origin': 'SSA', 'Destination': 'OICT', 'Current Loc': 'PET'},
+    {'Container #': 'MSCU0000006', 'Trade Type': '', 'Origin': 'SSA', 'Destination': 'OICT', 'Current Loc': 'PET'},
+    {'Container #': 'MSCU0000007', 'Trade Type': np.nan, 'Origin': 'SSA', 'Destination': 'OICT', 'Current Loc': 'PET'},
+    {'Container #': 'MSCU0000008', 'Trade Type': None, 'Origin': 'SSA', 'Destination': 'OICT', 'Current Loc': 'PET'},
+    # Destination / Origin fall back to Current Loc when NaN, blank or 'N/A'
+    {'Container #': 'MSCU0000009', 'Trade Type': 'IMPORT', 'Origin': np.nan, 'Destination': np.nan, 'Current Loc': 'HUSKY'},
+    {'Container #': 'MSCU0000010', 'Trade Type': 'IMPORT', 'Origin': '', 'Destination': '  ', 'Current Loc': 'HUSKY'},
+    {'Container #': 'MSCU0000011', 'Trade Type': 'IMPORT', 'Origin': 'N/A', 'Destination': 'n/a', 'Current Loc': 'HUSKY'},
+    {'Container #': 'MSCU0000012', 'Trade Type': 'EXPORT', 'Origin': 'N/A', 'Destination': 'N/A', 'Current Loc': ' TRP1 '},
+    {'Container #': 'MSCU0000013', 'Trade Type': 'EXPORT', 'Origin': None, 'Destination': None, 'Current Loc': 'TRP1'},
+    # Nothing usable anywhere, or codes that are not in TERMINAL_MAPPING
+    {'Container #': 'MSCU0000014', 'Trade Type': 'IMPORT', 'Origin': np.nan, 'Destination': 'N/A', 'Current Loc': np.nan},
+    {'Container #': 'MSCU0000015', 'Trade Type': 'EXPORT', 'Origin': '', 'Destination': '', 'Current Loc': 'N/A'},
+    {'Container #': 'MSCU0000016', 'Trade Type': 'IMPORT', 'Origin': 'XXX', 'Destination': 'YYY', 'Current Loc': 'TTI'},
+    {'Container #': 'MSCU0000017', 'Trade Type': 'EXPORT', 'Origin': 'pct', 'Destination': 'ITS', 'Current Loc': 'TTI'},
+]
+
+# Bulk info: pregate passed, not passed, missing key; other containers have no entry
+BULK_INFO = {
+    'MSCU0000001': {'success': True, 'pregate_status': True},
+    'MSCU0000003': {'success': True, 'pregate_status': False},
+    'MSCU0000009': {'success': True, 'pregate_status': True},
+    'MSCU0000011': {'success': True},
+    'MSCU0000014': {'success': True, 'pregate_status': True},
+    'MSCU0000016': {'success': True, 'pregate_status': False},
+}
+
+
+def _plan(df):
+    """Run _plan_checks the way the check loop calls it"""
+    container_nums = df['Container #'].astype(str).str.strip().tolist()
+    trade_types = df['Trade Type'].astype(str).str.strip().str.upper().tolist()
+    service = QueryService(emodal_client=None)
+    return container_nums, service._plan_checks(df, container_nums, trade_types, BULK_INFO)
+
+
+def _per_row(df, container_nums):
+    """Resolve the same rows with the per-row helpers used by get_check"""
+    move_types, terminals = [], []
+    for container_num, container_data in zip(container_nums, df.to_dict('records')):
+        timeline_response = {'passed_pregate': BULK_INFO.get(container_num, {}).get('pregate_status', False)}
+        move_type = determine_move_type(container_data, timeline_response)
+        move_types.append(move_type)
+        terminals.append(determine_terminal(container_data, QueryService.TERMINAL_MAPPING, move_type))
+    return move_types, terminals
+
+
+def _assert_same(df):
+    container_nums, (plan_moves, plan_terminals) = _plan(df)
+    row_moves, row_terminals = _per_row(df, container_nums)
+    for container_num, plan_move, row_move, plan_terminal, row_terminal in zip(
+        container_nums, plan_moves, row_moves, plan_terminals, row_terminals
+    ):
+        assert plan_move == row_move, f"{container_num}: move type {plan_move!r} != {row_move!r}"
+        assert plan_terminal == row_terminal, f"{container_num}: terminal {plan_terminal!r} != {row_terminal!r}"
+    assert len(plan_moves) == len(plan_terminals) == len(df)
+
+
+def test_plan_checks_matches_per_row_helpers():
+    """All location columns present"""
+    _assert_same(pd.DataFrame(ROWS))
+
+
+def test_plan_checks_matches_without_location_columns():
+    """Destination / Origin columns missing entirely (only Current Loc)"""
+    _assert_same(pd.DataFrame(ROWS).drop(columns=['Destination', 'Origin']))
+
+
+def test_plan_checks_matches_without_current_loc():
+    """Current Loc column missing entirely"""
+    _assert_same(pd.DataFrame(ROWS).drop(columns=['Current Loc']))
+
+
+def test_plan_checks_empty():
+    """No pending containers"""
+    _assert_same(pd.DataFrame(ROWS).iloc[0:0])
+
+
+def main():
+    tests = [
+        test_plan_checks_matches_per_row_helpers,
+        test_plan_checks_matches_without_location_columns,
+        test_plan_checks_matches_without_current_loc,
+        test_plan_checks_empty,
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"[PASS] {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"[FAIL] {test.__name__}: {e}")
+    
+    print(f"\n{len(tests) - failed}/{len(tests)} passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,13 @@
+import os
+import glob
+import shutil
 import secrets
 import string
+import threading
+
+# Directories this process already created, so repeat calls skip the syscalls
+_created_dirs = set()
+_created_dirs_lock = threading.Lock()
 
 def generate_short_token(length=12):
     """Generate random alphanumeric token"""
@@ -7,3 +15,51 @@ def generate_short_token(length=12):
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
 
+def ensure_dir(path):
+    """Create directory (and parents) once per process"""
+    if path in _created_dirs:
+        return
+    os.makedirs(path, exist_ok=True)
+    with _created_dirs_lock:
+        _created_dirs.add(path)
+
+
+def forget_dirs(root):
+    """Forget created directories under root (call before deleting it)"""
+    root = os.path.normpath(root)
+    with _created_dirs_lock:
+        for path in [p for p in _created_dirs if os.path.normpath(p) == root or os.path.normpath(p).startswith(root + os.sep)]:
+            _created_dirs.discard(path)
+
+
+def link_or_copy(src, dst):
+    """
+    Make dst a hard link to src, falling back to a copy across filesystems
+    
+    The link (or copy) is created under a temporary name and renamed over
+    dst, so readers never see a missing or partially written file.
+    """
+    tmp = f"{dst}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+def sweep_deleting(storage_path):
+    """
+    Remove query folders left behind by an interrupted delete
+    
+    delete_query renames a query folder to <query_id>.deleting and removes it
+    in a background thread; if the process stops first, the folder stays.
+    
+    Returns:
+        int: Number of folders removed
+    """
+    pattern = os.path.join(storage_path, 'users', '*', 'emodal', 'queries', '*.deleting')
+    removed = 0
+    for path in glob.glob(pattern):
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    return removed